@@ -0,0 +1,124 @@
+import numpy as np
+
+import p2_t3
+
+# win_table and the cell bits of every 9-bit mask as arrays, so whole batches can be looked up at once.
+win_array = np.array(p2_t3.win_table, dtype=bool)
+cell_bits = np.array([[(mask >> i) & 1 for i in range(9)] for mask in range(512)], dtype=bool)
+outer_bits = np.array([1 << i for i in range(9)], dtype=np.int16)
+
+DRAW = 3
+
+
+def to_arrays(states, playouts):
+    """ Unpacks tuple states into the arrays the batch engine works on, repeating each state playouts times.
+
+    Returns:    The sub-board masks (K, 9, 2), the macro masks (K, 2), the constraint as 3 * R + C or -1 (K,)
+                and the player to move (K,).
+
+    """
+    rows = np.repeat(np.array([state[:20] for state in states], dtype=np.int16), playouts, axis=0)
+    constraint = np.repeat(np.array([-1 if state[20] is None else 3 * state[20] + state[21]
+                                     for state in states], dtype=np.int8), playouts)
+    player = np.repeat(np.array([state[-1] for state in states], dtype=np.int8), playouts)
+    return rows[:, :18].reshape(-1, 9, 2).copy(), rows[:, 18:20].copy(), constraint, player
+
+
+def outcomes_of(macro):
+    """ Returns 1 or 2 for a won game, DRAW for a drawn one and 0 for a running one, per row of macro. """
+    p1, p2 = macro[:, 0], macro[:, 1]
+    outcome = np.zeros(len(macro), dtype=np.int8)
+    outcome[(p1 | p2) == 0x1ff] = DRAW
+    outcome[win_array[p2 & ~p1]] = 2
+    outcome[win_array[p1 & ~p2]] = 1
+    return outcome
+
+
+def play(boards, macro, constraint, player, rng, depth=None):
+    """ Plays random moves on the arrays of to_arrays() in place, in lockstep, until every game has ended or depth
+    moves have been played.
+
+    Returns:    The outcome of each game as outcomes_of() gives it, 0 for one cut off by depth.
+
+    """
+    outcome = outcomes_of(macro)
+
+    running = np.flatnonzero(outcome == 0)
+    steps = 0
+    while running.size and steps != depth:
+        sub = boards[running]
+        occupied = sub[:, :, 0] | sub[:, :, 1]
+        finished = macro[running, 0] | macro[running, 1]
+        open_boards = (finished[:, None] & outer_bits) == 0
+        target = constraint[running]
+        open_boards &= (target[:, None] < 0) | (np.arange(9) == target[:, None])
+
+        legal = ~cell_bits[occupied] & open_boards[:, :, None]
+        keys = rng.random(legal.shape)
+        keys[~legal] = -1.
+        move = keys.reshape(len(running), 81).argmax(axis=1)
+        outer, cell = move // 9, move % 9
+
+        side = player[running] - 1
+        boards[running, outer, side] |= (1 << cell).astype(np.int16)
+        mine = boards[running, outer, side]
+        both = boards[running, outer, 0] | boards[running, outer, 1]
+        won = win_array[mine]
+        full = ~won & (both == 0x1ff)
+
+        captured = (1 << outer).astype(np.int16)
+        macro[running[won], side[won]] |= captured[won]
+        macro[running[full], 0] |= captured[full]
+        macro[running[full], 1] |= captured[full]
+
+        closed = ((macro[running, 0] | macro[running, 1]) >> cell) & 1
+        constraint[running] = np.where(closed == 1, -1, cell)
+        player[running] = 3 - player[running]
+
+        outcome[running] = outcomes_of(macro[running])
+        running = running[outcome[running] == 0]
+        steps += 1
+
+    return outcome
+
+
+def rollout_batch(states, playouts=1, rng=None):
+    """ Plays uniformly random playouts of many games in lockstep.
+
+    Every unfinished game makes one random legal move per step, found with table lookups on the masks, until
+    all of them have ended.
+
+    Args:
+        states:     A list of states to play out.
+        playouts:   Number of playouts per state.
+        rng:        A numpy Generator; a fresh default one if None.
+
+    Returns:        An int8 array of shape (len(states), playouts) holding 1 or 2 for the winner, or DRAW.
+
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    boards, macro, constraint, player = to_arrays(states, playouts)
+    outcome = play(boards, macro, constraint, player, rng)
+    return outcome.reshape(len(states), playouts)
+
+
+def win_counts(state, playouts, identity, rng=None, depth=None):
+    """ Plays playouts random games from state and returns identity's total win_values over them. With depth,
+    games still running after depth moves are scored together by evaluator.value().
+    """
+    if depth is None:
+        outcome = rollout_batch([state], playouts, rng)
+        return float(np.count_nonzero(outcome == identity) + 0.5 * np.count_nonzero(outcome == DRAW))
+
+    import evaluator    # Deferred: evaluator builds on this module's tables.
+    if rng is None:
+        rng = np.random.default_rng()
+    boards, macro, constraint, player = to_arrays([state], playouts)
+    outcome = play(boards, macro, constraint, player, rng, depth)
+    running = outcome == 0
+    total = np.count_nonzero(outcome == identity) + 0.5 * np.count_nonzero(outcome == DRAW)
+    if running.any():
+        total += evaluator.value(boards[running], macro[running], constraint[running], player[running],
+                                 identity).sum()
+    return float(total)
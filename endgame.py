@@ -0,0 +1,91 @@
+from p2_t3 import winning_cells
+
+# Bounds stored with memoized values.
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def remaining_moves(state):
+    """ Returns the number of empty cells left in the sub-boards that are still open. """
+    closed = state[18] | state[19]
+    count = 0
+    for outer in range(9):
+        if not closed & (1 << outer):
+            count += 9 - bin(state[2 * outer] | state[2 * outer + 1]).count('1')
+    return count
+
+
+class EndgameSolver:
+    def __init__(self, threshold=12, max_entries=1000000):
+        """ Exact minimax with alpha-beta pruning and a memo table, for positions close to the end of the game.
+
+        Values are +1 for a win, 0 for a draw and -1 for a loss, from the point of view of the player to move.
+
+        Args:
+            threshold:      Positions are solved only when at most this many moves are left (see remaining_moves).
+            max_entries:    The memo is cleared when it grows past this many positions.
+
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.memo = {}
+
+        self.solved = 0         # Positions solved for callers.
+        self.nodes = 0          # Positions visited by the search, memo hits included.
+
+    def can_solve(self, state):
+        return remaining_moves(state) <= self.threshold
+
+    def solve(self, board, state):
+        """ Returns the exact value of state for the player to move. """
+        if len(self.memo) > self.max_entries:
+            self.memo.clear()
+        self.solved += 1
+        return self.negamax(board, state, -1, 1)
+
+    def negamax(self, board, state, alpha, beta):
+        self.nodes += 1
+        values = board.win_values(state)
+        if values is not None:
+            return 2 * values[state[-1]] - 1
+
+        entry = self.memo.get(state)
+        if entry is not None:
+            value, bound = entry
+            if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                return value
+
+        original_alpha = alpha
+        best = -1
+        for action in self.ordered_actions(board, state):
+            value = -self.negamax(board, board.next_state(state, action), -beta, -alpha)
+            if value > best:
+                best = value
+                if best > alpha:
+                    alpha = best
+                    if alpha >= beta:
+                        break
+
+        if best <= original_alpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.memo[state] = (best, bound)
+        return best
+
+    def ordered_actions(self, board, state):
+        """ Returns the legal actions with sub-board captures first, so cutoffs come early. """
+        player_index = state[-1] - 1
+        captures = []
+        others = []
+        for action in board.legal_actions(state):
+            R, C, r, c = action
+            if winning_cells[state[2 * (3 * R + C) + player_index]] & (1 << (3 * r + c)):
+                captures.append(action)
+            else:
+                others.append(action)
+        return captures + others
+
+    def stats(self):
+        return {'solver_solved': self.solved, 'solver_nodes': self.nodes, 'solver_memo': len(self.memo)}
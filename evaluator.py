@@ -0,0 +1,192 @@
+import argparse
+from math import exp
+
+import numpy as np
+
+from p2_t3 import winning_cells
+import batch_rollout
+
+# Features of a position, each the difference between player 1's count and player 2's, except the last three,
+# which are +1 or -1 for the player to move (times whether it holds).
+feature_names = (
+    'center',           # The center sub-board won.
+    'corners',          # Corner sub-boards won.
+    'edges',            # Edge sub-boards won.
+    'macro_threats',    # Open sub-boards that would complete a macro-board line if won.
+    'board_threats',    # Free cells of open sub-boards that would complete a line there (two-in-a-rows).
+    'winning_threats',  # board_threats in the sub-boards counted by macro_threats, i.e. one move from winning.
+    'free_move',        # The player to move may play in any open sub-board.
+    'to_move',          # The player to move.
+    'capture_now',      # The player to move can win a sub-board it is allowed to play in.
+)
+
+# Bias, then one weight per feature, of a logistic model of player 1's score (win 1, draw 0.5, loss 0). Fit by
+# running this module on 400 self-play games of mcts:nodes=100 (selfplay.py --seed 1000): 16k positions, held-out
+# log loss 0.656 against 0.693 for a constant.
+weights = (0.2658, 0.2406, 0.2019, 0.1111, 0.0436, -0.0041, 0.7238, 0.2753, -0.0249, 0.1205)
+
+popcount = [bin(mask).count('1') for mask in range(512)]
+corner_mask = 0x145     # Sub-boards (0, 0), (0, 2), (2, 0) and (2, 2) as macro-board bits.
+edge_mask = 0xaa        # Sub-boards (0, 1), (1, 0), (1, 2) and (2, 1).
+
+popcount_array = np.array(popcount, dtype=np.int8)
+winning_array = np.array(winning_cells, dtype=np.int64)
+
+
+def features(sub, macro, constraint, player):
+    """ Computes the features of a batch of positions from their masks, with table lookups only.
+
+    Args:
+        sub:        Sub-board masks, shape (K, 9, 2) with player 1's before player 2's.
+        macro:      Macro-board masks, shape (K, 2).
+        constraint: 3 * R + C of the sub-board the player to move must play in, or -1, shape (K,).
+        player:     The player to move, shape (K,).
+
+    Returns:    A float array of shape (K, len(feature_names)).
+
+    """
+    sub = np.asarray(sub, dtype=np.int64)
+    macro = np.asarray(macro, dtype=np.int64)
+    constraint = np.asarray(constraint)
+    player = np.asarray(player)
+    count = len(player)
+
+    closed = macro[:, 0] | macro[:, 1]
+    won = np.stack([macro[:, 0] & ~macro[:, 1], macro[:, 1] & ~macro[:, 0]], axis=1)
+    open_boards = ~batch_rollout.cell_bits[closed]
+    threats = popcount_array[winning_array[sub] & ~sub[:, :, ::-1]] * open_boards[:, :, None]
+    macro_threats = winning_array[won] & ~closed[:, None]
+    on_line = batch_rollout.cell_bits[macro_threats].transpose(0, 2, 1)
+
+    values = np.empty((count, len(feature_names)))
+    for index, per_side in enumerate((
+            (won >> 4) & 1,
+            popcount_array[won & corner_mask],
+            popcount_array[won & edge_mask],
+            popcount_array[macro_threats],
+            threats.sum(axis=1),
+            (threats * on_line).sum(axis=1))):
+        values[:, index] = per_side[:, 0] - per_side[:, 1]
+
+    sign = np.where(player == 1, 1., -1.)
+    free = constraint < 0
+    allowed = open_boards & (free[:, None] | (np.arange(9) == constraint[:, None]))
+    mover_threats = threats[np.arange(count), :, player - 1]
+    values[:, 6] = sign * free
+    values[:, 7] = sign
+    values[:, 8] = sign * (mover_threats * allowed).any(axis=1)
+    return values
+
+
+def record_features(records):
+    """ features() of an array of selfplay.record_dtype records. """
+    boards = records['boards'].astype(np.int64)
+    return features(boards[:, :18].reshape(-1, 9, 2), boards[:, 18:20], records['constraint'], records['player'])
+
+
+def value(sub, macro, constraint, player, identity, weights=weights):
+    """ Scores a batch of positions for identity: the exact win_values of finished games, the logistic model's
+    expected score otherwise. The arguments are those of features().
+
+    Returns:    A float array of shape (K,) with values in [0, 1].
+
+    """
+    weights = np.asarray(weights)
+    scores = 1 / (1 + np.exp(-(weights[0] + features(sub, macro, constraint, player) @ weights[1:])))
+    outcome = batch_rollout.outcomes_of(np.asarray(macro, dtype=np.int64))
+    scores[outcome == 1] = 1.
+    scores[outcome == 2] = 0.
+    scores[outcome == batch_rollout.DRAW] = 0.5
+    return scores if identity == 1 else 1 - scores
+
+
+def evaluate(states, identity, weights=weights):
+    """ value() of a list of tuple states. """
+    sub, macro, constraint, player = batch_rollout.to_arrays(states, 1)
+    return value(sub, macro, constraint, player, identity, weights)
+
+
+def state_value(state, identity, weights=weights):
+    """ value() of one unfinished state, computed without NumPy, which costs more than the features for a single
+    position. Used by the rollouts that score the position they cut off at.
+    """
+    closed = state[18] | state[19]
+    won = (state[18] & ~state[19], state[19] & ~state[18])
+    mover = state[-1] - 1
+    outer_constraint = -1 if state[20] is None else 3 * state[20] + state[21]
+
+    z = weights[0]
+    capture_now = False
+    for side in (0, 1):
+        sign = 1 if side == 0 else -1
+        mask = won[side]
+        line_boards = winning_cells[mask] & ~closed
+        board_threats = winning_threats = 0
+        for outer in range(9):
+            if not closed & (1 << outer):
+                threats = popcount[winning_cells[state[2 * outer + side]] & ~state[2 * outer + 1 - side]]
+                board_threats += threats
+                if line_boards & (1 << outer):
+                    winning_threats += threats
+                if threats and side == mover and outer_constraint in (-1, outer):
+                    capture_now = True
+        z += sign * (weights[1] * ((mask >> 4) & 1) + weights[2] * popcount[mask & corner_mask]
+                     + weights[3] * popcount[mask & edge_mask] + weights[4] * popcount[line_boards]
+                     + weights[5] * board_threats + weights[6] * winning_threats)
+
+    sign = 1 if mover == 0 else -1
+    z += sign * (weights[7] * (outer_constraint < 0) + weights[8] + weights[9] * capture_now)
+    score = 1 / (1 + exp(-z))
+    return score if identity == 1 else 1 - score
+
+
+def fit(records, l2=1e-3, iterations=25):
+    """ Fits the logistic model to game records by Newton's method on the cross-entropy loss, with the final
+    score of player 1 as the soft target.
+
+    Args:
+        records:    An array of selfplay.record_dtype records, e.g. selfplay.read_records(path).
+        l2:         Ridge penalty per position on the feature weights.
+        iterations: Newton steps.
+
+    Returns:    The weights, bias first, as a tuple.
+
+    """
+    x = np.hstack([np.ones((len(records), 1)), record_features(records)])
+    y = (records['result'].astype(np.float64) + 1) / 2
+    penalty = l2 * len(records) * np.eye(x.shape[1])
+    penalty[0, 0] = 0.
+    w = np.zeros(x.shape[1])
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-x @ w))
+        gradient = x.T @ (p - y) + penalty @ w
+        hessian = (x * (p * (1 - p))[:, None]).T @ x + penalty
+        w -= np.linalg.solve(hessian, gradient)
+    return tuple(float(weight) for weight in w)
+
+
+def log_loss(records, weights=weights):
+    """ Returns the mean cross-entropy of the model's scores for player 1 against the records' results. """
+    x = record_features(records)
+    p = 1 / (1 + np.exp(-(weights[0] + x @ np.asarray(weights[1:]))))
+    p = np.clip(p, 1e-9, 1 - 1e-9)
+    y = (records['result'].astype(np.float64) + 1) / 2
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+if __name__ == '__main__':
+    import selfplay
+
+    parser = argparse.ArgumentParser(description="Fit the evaluator's weights to self-play game files.")
+    parser.add_argument('games', nargs='+', help="game files written by selfplay.py")
+    parser.add_argument('--l2', type=float, default=1e-3, help="ridge penalty on the feature weights")
+    parser.add_argument('--holdout', type=float, default=0.2, help="share of games kept out of the fit")
+    args = parser.parse_args()
+
+    records = np.concatenate([selfplay.read_records(path) for path in args.games])
+    held = (records['seed'] % 100) < 100 * args.holdout      # Whole games, so positions of one game stay together.
+    fitted = fit(records[~held], args.l2)
+    print("Fit on %d positions, held out %d" % (np.count_nonzero(~held), np.count_nonzero(held)))
+    print("Held-out log loss: %.4f fitted, %.4f current weights, %.4f constant" % (
+        log_loss(records[held], fitted), log_loss(records[held]), np.log(2)))
+    print("weights = (%s)" % ', '.join('%.4f' % weight for weight in fitted))
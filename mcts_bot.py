@@ -0,0 +1,186 @@
+import threading
+
+import mcts_vanilla
+from node_pool import node_bytes
+
+
+class MCTSBot:
+    def __init__(self, strategy=mcts_vanilla, max_nodes=None, time_budget_ms=None, table=None):
+        """ A stateful MCTS player that keeps its tree from one move to the next.
+
+        After the bot moves and the opponent replies, the grandchild of the old root matching the new state
+        becomes the root, so the visits already spent below it carry over to the next search.
+
+        Args:
+            strategy:       Module or object providing search() and best_action(), e.g. mcts_vanilla,
+                            mcts_modified or an mcts_engine.MCTS.
+            max_nodes:      Cap on the nodes grown per move, passed on to strategy.search().
+            time_budget_ms: Wall-clock budget per move, passed on to strategy.search().
+            table:          Optional TranspositionTable kept across moves, passed on to strategy.search().
+
+        """
+        self.strategy = strategy
+        self.max_nodes = max_nodes
+        self.time_budget_ms = time_budget_ms
+        self.table = table
+
+        self.root = None            # Root of the retained tree, or None before the first move.
+        self.root_state = None      # The state the root node stands for.
+        self.identity = None        # The player number the tree's win counts are kept for.
+        self.last_search = {}       # Statistics of the most recent search.
+
+    def reset(self):
+        """ Drops the retained tree and empties the transposition table. """
+        if self.table is not None:
+            self.table.entries.clear()
+        self.root = None
+        self.root_state = None
+        self.identity = None
+
+    def advance(self, board, state):
+        """ Finds the node standing for state in the retained tree.
+
+        The retained root is the node reached by the bot's own last move, so the opponent's reply leads to one
+        of its children, i.e. a grandchild of the root the last search started from.
+
+        Args:
+            board:  The game setup.
+            state:  The state the next search starts from.
+
+        Returns:    The matching node detached from its parent, or None if the tree does not contain state.
+
+        """
+        if self.root is None or board.current_player(state) != self.identity:
+            return None
+
+        for action, child in self.root.child_nodes.items():
+            if board.next_state(self.root_state, action) == state:
+                # Cutting the parent link frees the rest of the old tree.
+                child.parent = None
+                del self.root.child_nodes[action]
+                self.recycle(self.root)
+                return child
+        return None
+
+    def recycle(self, node):
+        """ Hands a discarded part of the tree back to the strategy's NodePool, if it has one. """
+        pool = getattr(self.strategy, 'pool', None)
+        if pool is not None:
+            pool.release(node)
+
+    def think(self, board, state):
+        """ Searches from state, reusing the matching part of the previous tree, and returns the chosen action.
+
+        Args:
+            board:  The game setup.
+            state:  The state of the game.
+
+        Returns:    The action to be taken.
+
+        """
+        root = self.advance(board, state)
+        if root is None:
+            if self.root is not None:
+                self.recycle(self.root)
+                self.root = None
+            # Table entries hold win counts for one side only.
+            if board.current_player(state) != self.identity:
+                self.reset()
+            self.identity = board.current_player(state)
+        carried_visits = root.visits if root is not None else 0
+
+        max_nodes, time_budget_ms = self.budget(carried_visits)
+        root, stats = self.strategy.search(board, state, root, max_nodes, time_budget_ms, table=self.table)
+        action = self.strategy.best_action(root, board, state, self.identity)
+
+        # Keep the subtree under our own move; the opponent's reply is matched against it next time.
+        self.root = root.child_nodes.pop(action)
+        self.root.parent = None
+        self.recycle(root)
+        self.root_state = board.next_state(state, action)
+
+        self.last_search = dict(stats, carried_visits=carried_visits)
+        return action
+
+    def budget(self, carried_visits):
+        """ Returns the max_nodes and time_budget_ms of the next search, given the visits its root already has. """
+        return self.max_nodes, self.time_budget_ms
+
+    __call__ = think
+
+
+class PonderingBot(MCTSBot):
+    def __init__(self, strategy, max_nodes=None, time_budget_ms=None, table=None, ponder_mb=64):
+        """ An MCTSBot that keeps searching in a background thread while the opponent thinks.
+
+        After each move the subtree under the bot's own move is grown further, with the opponent to move, until
+        the opponent's move arrives. think() cancels that search, keeps the subtree of the reply and counts its
+        visits toward the move's budget, so a well-predicted reply is answered at once at the usual strength.
+
+        The ponder thread only gets the processor while the opponent's thread waits, as a human at the input()
+        prompt does; against a bot in the same process it slows both.
+
+        Args:
+            strategy:       An mcts_engine.MCTS, whose search() takes the identity and cancel pondering needs.
+            max_nodes:      Cap on the nodes grown per move, passed on to strategy.search().
+            time_budget_ms: Wall-clock budget per move, passed on to strategy.search().
+            table:          Optional TranspositionTable kept across moves, passed on to strategy.search().
+            ponder_mb:      Memory the nodes grown by one ponder may take, at node_pool.node_bytes each; the
+                            ponder stops when it is used up. 0 turns pondering off.
+
+        """
+        MCTSBot.__init__(self, strategy, max_nodes, time_budget_ms, table)
+        self.ponder_nodes = int(ponder_mb * (1 << 20) // node_bytes)
+        self.cancel = threading.Event()
+        self.thread = None
+        self.last_ponder = {}       # Statistics of the most recent ponder search.
+
+    def start(self, board):
+        """ Starts pondering on the tree under the bot's last move, unless that move ended the game. """
+        if self.root is None or not self.ponder_nodes or board.is_ended(self.root_state):
+            return
+        self.cancel.clear()
+        self.last_ponder = {}
+        self.thread = threading.Thread(target=self.ponder, args=(board, self.root, self.root_state), daemon=True)
+        self.thread.start()
+
+    def ponder(self, board, root, state):
+        _, self.last_ponder = self.strategy.search(board, state, root, self.ponder_nodes, None, table=self.table,
+                                                   identity=self.identity, cancel=self.cancel)
+
+    def stop(self):
+        """ Cancels the ponder search, if one is running, and waits for it to return. """
+        if self.thread is not None:
+            self.cancel.set()
+            self.thread.join()
+            self.thread = None
+
+    def reset(self):
+        self.stop()
+        MCTSBot.reset(self)
+
+    def budget(self, carried_visits):
+        """ Takes the visits already below the root off the node budget, and the share of the time budget that
+        they would have taken at the last search's rate off the time budget.
+        """
+        max_nodes, time_budget_ms = self.max_nodes, self.time_budget_ms
+        if max_nodes is None and time_budget_ms is None:
+            max_nodes, time_budget_ms = self.strategy.max_nodes, self.strategy.time_budget_ms
+        # At least check_every iterations run, so even a root that pondering did not expand gets children.
+        if max_nodes is not None:
+            max_nodes = max(mcts_vanilla.check_every, max_nodes - carried_visits)
+        rate = self.last_search.get('iterations_per_second')
+        if time_budget_ms is not None and rate:
+            time_budget_ms *= max(0., 1 - carried_visits / (rate * time_budget_ms / 1000.))
+        return max_nodes, time_budget_ms
+
+    def think(self, board, state):
+        """ Stops pondering, searches from state as MCTSBot.think does, then ponders on the reply. """
+        self.stop()
+        pondered = self.last_ponder.get('iterations', 0)
+        action = MCTSBot.think(self, board, state)
+        self.last_search['ponder_iterations'] = pondered
+        self.start(board)
+        return action
+
+    __call__ = think
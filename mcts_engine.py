@@ -0,0 +1,657 @@
+import copy
+import math
+import random
+import time
+from math import sqrt, log
+
+import mcts_vanilla
+import mcts_modified
+from mcts_node import MCTSNode
+from mcts_vanilla import expand_leaf, backpropagate
+from rollout_cache import RolloutCache
+from endgame import EndgameSolver
+from profiling import SearchProfile
+from node_pool import NodePool
+from transposition import TranspositionTable
+
+# Policy registries, name -> class. Bots are built from these by name, see p2_bots.py.
+selectors = {}
+rollouts = {}
+finals = {}
+
+
+def register(registry, name):
+    """ Class decorator adding a policy class to registry under name. """
+    def decorator(cls):
+        registry[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+
+def descend(node, board, state, identity, path, selector):
+    """ Walks down the tree like mcts_vanilla.traverse_nodes, but scores children with selector.
+
+    selector.prepare(node, mine) is called once per node, mine telling whether the bot is to move there, and its
+    result handed to selector.score(win_rate, child, action, term) for each child, win_rate being the child's
+    from the point of view of the player to move. Proven nodes are handled the same way.
+
+    Returns:    A node from which the next stage of the search can proceed, and its state.
+
+    """
+    current = node
+    buffer = None
+    hashed = hasattr(state, 'zobrist')
+    player = state[-1]
+    while True:
+        if path is not None:
+            path.append(current)
+        if current.untried_actions or not current.child_nodes or current.proven is not None:
+            break
+
+        mine = identity == player
+        term = selector.prepare(current, mine)
+        won = 1 if mine else 0
+        greatest_child = None
+        greatest_action = None
+        greatest_score = -math.inf
+        for action, child in current.child_nodes.items():
+            if child.proven is not None:
+                if child.proven == won:
+                    greatest_child = child
+                    greatest_action = action
+                    break
+                if child.proven == 1 - won:
+                    continue
+            win_rate = child.wins / child.visits
+            if not mine:
+                win_rate = 1 - win_rate
+            score = selector.score(win_rate, child, action, term)
+            if score > greatest_score:
+                greatest_child = child
+                greatest_action = action
+                greatest_score = score
+        if greatest_child is None:
+            break
+
+        if hashed:
+            state = board.next_state(state, greatest_action)
+            player = state[-1]
+        else:
+            if buffer is None:
+                buffer = list(state)
+            board.apply(buffer, greatest_action)
+            player = buffer[-1]
+        current = greatest_child
+
+    if buffer is None:
+        return current, state
+    return current, tuple(buffer)
+
+
+def node_depth(node, root):
+    """ Returns the number of moves from root down to node, following parent links. """
+    depth = 0
+    while node is not root and node.parent is not None:
+        node = node.parent
+        depth += 1
+    return depth
+
+
+@register(selectors, 'uct')
+class UCT:
+    def __init__(self, c=None):
+        """ UCB1 applied to trees, using mcts_vanilla.traverse_nodes.
+
+        Args:
+            c:  Exploration constant, defaulting to mcts_vanilla.explore_faction.
+
+        """
+        self.c = mcts_vanilla.explore_faction if c is None else c
+
+    def select(self, node, board, state, identity, path=None):
+        return mcts_vanilla.traverse_nodes(node, board, state, identity, path, explore=self.c)
+
+
+@register(selectors, 'ucb1_tuned')
+class UCB1Tuned:
+    def __init__(self, c=1.):
+        """ UCB1-Tuned, bounding each child's exploration term by an estimate of its reward variance.
+
+        Nodes keep no sum of squared rewards, so the variance of a reward in [0, 1] with mean p is taken as
+        p * (1 - p), which is exact for win/loss results and an upper bound once draws are counted.
+
+        Args:
+            c:  Scale of the exploration term.
+
+        """
+        self.c = c
+
+    def prepare(self, node, mine):
+        return log(node.visits)
+
+    def score(self, win_rate, child, action, log_parent):
+        visits = child.visits
+        variance = win_rate * (1 - win_rate) + sqrt(2 * log_parent / visits)
+        return win_rate + self.c * sqrt(log_parent / visits * min(0.25, variance))
+
+    def select(self, node, board, state, identity, path=None):
+        return descend(node, board, state, identity, path, self)
+
+
+@register(selectors, 'puct')
+class PUCT:
+    def __init__(self, c=1.5):
+        """ The PUCT rule with a uniform prior over each node's legal actions.
+
+        Args:
+            c:  Exploration constant.
+
+        """
+        self.c = c
+
+    def prepare(self, node, mine):
+        return self.c * sqrt(node.visits) / (len(node.child_nodes) + len(node.untried_actions))
+
+    def score(self, win_rate, child, action, term):
+        return win_rate + term / (1 + child.visits)
+
+    def select(self, node, board, state, identity, path=None):
+        return descend(node, board, state, identity, path, self)
+
+
+@register(selectors, 'rave')
+class RAVE:
+    amaf = True     # Tells MCTS.search to collect each simulation's moves and hand them to update().
+
+    def __init__(self, c=0.5, k=50):
+        """ UCT blended with all-moves-as-first values (Gelly and Silver's RAVE).
+
+        Every node keeps, per action, the results of the simulations through it in which the player to move there
+        played that action at any later point. A child's value mixes its own win rate with that AMAF rate,
+        weighted by beta = sqrt(k / (3 * visits + k)): AMAF dominates while the child has few visits and fades
+        as they grow.
+
+        Args:
+            c:  Exploration constant of the UCT term.
+            k:  Equivalence parameter: the visit count at which both rates weigh the same (beta = 1/2).
+
+        """
+        self.c = c
+        self.k = k
+
+    def prepare(self, node, mine):
+        return self.c * sqrt(log(node.visits)), node.amaf or {}, mine
+
+    def score(self, win_rate, child, action, term):
+        scale, amaf, mine = term
+        n = child.visits
+        entry = amaf.get(action)
+        if entry is not None:
+            # AMAF counts are kept for the bot, like wins: turn them around where the opponent is to move.
+            amaf_rate = entry[0] / entry[1]
+            if not mine:
+                amaf_rate = 1 - amaf_rate
+            beta = sqrt(self.k / (3 * n + self.k))
+            win_rate = (1 - beta) * win_rate + beta * amaf_rate
+        return win_rate + scale / sqrt(n)
+
+    def select(self, node, board, state, identity, path=None):
+        return descend(node, board, state, identity, path, self)
+
+    def update(self, path, moves, won, visits):
+        """ Adds a simulation's result to the AMAF counts along path.
+
+        Args:
+            path:   The nodes from the root down to the new leaf.
+            moves:  The actions played after the leaf, in order.
+            won:    The result for the searching bot, as backpropagated.
+            visits: The number of playouts won summarizes.
+
+        """
+        actions = [child.parent_action for child in path[1:]] + moves
+        for depth, node in enumerate(path):
+            amaf = node.amaf
+            if amaf is None:
+                amaf = node.amaf = {}
+            # Moves at even distances were made by the player to move at node.
+            for action in actions[depth::2]:
+                entry = amaf.get(action)
+                if entry is None:
+                    amaf[action] = [won, visits]
+                else:
+                    entry[0] += won
+                    entry[1] += visits
+
+
+@register(rollouts, 'random')
+class RandomRollout:
+    def __init__(self, play=None, depth=None):
+        """ Scores a leaf by one playout to the end of the game, or to depth moves and then by the evaluator.
+
+        Args:
+            play:   A rollout function returning the final state, defaulting to mcts_vanilla.rollout. With depth it
+                    is called as play(board, state, moves, depth).
+            depth:  The most moves played before an unfinished game is scored by evaluator.state_value (needs
+                    numpy); None plays to the end.
+
+        """
+        self.play = play or mcts_vanilla.rollout
+        self.depth = depth
+        if depth is not None:
+            import evaluator
+            self.evaluate = evaluator.state_value
+
+    def __call__(self, board, state, identity, moves=None):
+        """ Returns identity's total win_values over the playouts and the number of playouts. If moves is a list,
+        the actions played are appended to it.
+        """
+        if self.depth is not None:
+            state = self.play(board, state, moves, self.depth)
+            values = board.win_values(state)
+            if values is None:
+                return self.evaluate(state, identity), 1
+            return values[identity], 1
+        if moves is None:
+            return board.win_values(self.play(board, state))[identity], 1
+        return board.win_values(self.play(board, state, moves))[identity], 1
+
+
+@register(rollouts, 'heuristic')
+class HeuristicRollout(RandomRollout):
+    def __init__(self, depth=None):
+        """ One playout with mcts_modified's complete-or-block rollout, cut off at depth moves if set. """
+        RandomRollout.__init__(self, mcts_modified.rollout, depth)
+
+
+@register(rollouts, 'cutoff')
+class CutoffRollout(RandomRollout):
+    def __init__(self, depth=10):
+        """ Plays at most depth random moves, then scores unfinished games with the evaluator (needs numpy).
+
+        Args:
+            depth:  The most moves played before the position is scored.
+
+        """
+        RandomRollout.__init__(self, mcts_vanilla.rollout, depth)
+
+
+@register(rollouts, 'batch')
+class BatchRollout:
+    def __init__(self, playouts=64, depth=None):
+        """ Scores a leaf by many random playouts run together in batch_rollout (needs numpy).
+
+        Args:
+            playouts:   Playouts per leaf.
+            depth:      The most moves per playout; the games still running are then scored together by
+                        evaluator.value. None plays to the end.
+
+        """
+        self.playouts = playouts
+        self.depth = depth
+        self.rng = None
+
+    def __call__(self, board, state, identity):
+        import batch_rollout
+        if self.rng is None:
+            self.rng = batch_rollout.np.random.default_rng(random.getrandbits(64))
+        return batch_rollout.win_counts(state, self.playouts, identity, self.rng, self.depth), self.playouts
+
+
+class CachedRollout:
+    def __init__(self, inner, cache, min_games=4, prime=False):
+        """ Wraps a rollout policy with a RolloutCache, skipping the playout for positions already played out.
+
+        A position is played out afresh, and its result added to the entry, until the entry holds min_games
+        playouts; only then do hits reuse it, so a hit is an average rather than one frozen random game. Keys are
+        read from HashedState states in O(1), which is why MCTS.search hashes its root when the rollout is cached.
+
+        Args:
+            inner:      The rollout policy that scores positions missing from the cache.
+            cache:      A RolloutCache, usually kept for the bot's lifetime so it spans moves and games.
+            min_games:  Playouts an entry needs before it is reused.
+            prime:      If true a hit hands the node all the cached playouts, not just their average as one.
+
+        """
+        self.inner = inner
+        self.cache = cache
+        self.min_games = min_games
+        self.prime = prime
+
+    def __call__(self, board, state, identity):
+        key = board.zobrist(state)
+        cached = self.cache.lookup(key, self.min_games)
+        if cached is not None:
+            games, p1_score = cached
+            score = p1_score if identity == 1 else games - p1_score
+            if self.prime:
+                return score, games
+            return score / games, 1
+
+        won, visits = self.inner(board, state, identity)
+        self.cache.record(key, won if identity == 1 else visits - won, visits)
+        return won, visits
+
+    def stats(self):
+        return self.cache.stats()
+
+
+@register(finals, 'max')
+class MaxChild:
+    """ Picks the root child with the highest win rate, as mcts_vanilla.best_action does. """
+
+    def __call__(self, node, board, state, identity):
+        return mcts_vanilla.best_action(node, board, state, identity)
+
+
+@register(finals, 'robust')
+class RobustChild:
+    """ Picks the most visited root child, breaking ties by win rate. """
+
+    def __call__(self, node, board, state, identity):
+        return max(node.child_nodes.items(),
+                   key=lambda item: (item[1].visits, item[1].wins / item[1].visits))[0]
+
+
+class MCTS:
+    def __init__(self, selector=None, rollout=None, final=None, max_nodes=None, time_budget_ms=None, table=None,
+                 solver=None, pool=None):
+        """ Monte Carlo tree search assembled from a tree policy, a rollout policy and a final move choice.
+
+        An MCTS object has the same search() and best_action() as the mcts_vanilla module, so it can be used as
+        the strategy of MCTSBot or RootParallelBot, and think() makes it a player on its own.
+
+        Args:
+            selector:       Tree policy, UCT() if None.
+            rollout:        Rollout policy, RandomRollout() if None.
+            final:          Final move choice, MaxChild() if None.
+            max_nodes:      Default cap on the nodes grown per search.
+            time_budget_ms: Default wall-clock budget per search.
+            table:          Default TranspositionTable, or None.
+            solver:         An EndgameSolver. With one, new nodes close enough to the end are solved instead of
+                            rolled out and marked proven, proofs are passed up the tree (MCTS-Solver) and the
+                            search stops as soon as the root is proven. Selection stops at proven nodes and never
+                            enters a proven loss, and returning to a proven node does not count toward max_nodes.
+            pool:           A NodePool bounding the tree's size. Nodes come from it, and when it is full the
+                            lowest-visit subtrees are pruned and their nodes recycled.
+
+        Set profile to a profiling.SearchProfile to record per-phase timings and counters of every search.
+
+        """
+        self.selector = selector or UCT()
+        self.rollout = rollout or RandomRollout()
+        self.final = final or MaxChild()
+        self.max_nodes = max_nodes
+        self.time_budget_ms = time_budget_ms
+        self.table = table
+        self.solver = solver
+        self.pool = pool
+        self.profile = None
+        self.identity = None
+        self.last_search = {}
+
+    def search(self, board, state, root_node=None, max_nodes=None, time_budget_ms=None, table=None, identity=None,
+               cancel=None):
+        """ Grows the tree below root_node until the node cap or the deadline is reached, whichever comes first.
+
+        Args:
+            board:          The game setup.
+            state:          The state of the game at the root node.
+            root_node:      The tree to keep growing; a fresh root is created if None.
+            max_nodes:      Cap on the tree size. Without it or a time budget, the object's defaults are used,
+                            then mcts_vanilla.num_nodes.
+            time_budget_ms: Wall-clock budget in milliseconds, checked every mcts_vanilla.check_every iterations.
+            table:          A TranspositionTable, defaulting to the object's.
+            identity:       The player the tree's win counts are kept for, the player to move if None. Set to the
+                            other player to keep growing a tree while the opponent is to move (pondering).
+            cancel:         A threading.Event; the search returns once it is set, checked every
+                            mcts_vanilla.check_every iterations.
+
+        Returns:        The root node and a dict of search statistics (iterations, seconds, iterations_per_second,
+                        plus the table's counters when a table is used).
+
+        """
+        identity_of_bot = board.current_player(state) if identity is None else identity
+        pool = self.pool
+        make_node = pool if pool is not None else MCTSNode
+        if root_node is None:
+            root_node = make_node(parent=None, parent_action=None, action_list=board.legal_actions(state))
+        if max_nodes is None and time_budget_ms is None:
+            max_nodes, time_budget_ms = self.max_nodes, self.time_budget_ms
+            if max_nodes is None and time_budget_ms is None:
+                max_nodes = mcts_vanilla.num_nodes
+        if table is None:
+            table = self.table
+        if table is not None or isinstance(self.rollout, CachedRollout):
+            # Both look positions up by hash: keep it up to date move by move instead of computing it at every leaf.
+            state = board.hashed(state)
+        check_every = mcts_vanilla.check_every
+
+        start = time.perf_counter()
+        deadline = None
+        if time_budget_ms is not None:
+            deadline = start + time_budget_ms / 1000.
+
+        solver = self.solver
+        if root_node.proven is not None and all(child.proven != root_node.proven
+                                                for child in root_node.child_nodes.values()):
+            # Solved as a leaf of an earlier search: grow it again until a child carries the proof.
+            root_node.proven = None
+        # Profiling swaps in a move-counting board and times each phase; the checks are all it costs otherwise.
+        record = None
+        if self.profile is not None:
+            record = self.profile.start(state)
+            board = self.profile.board
+            clock = time.perf_counter
+        amaf = getattr(self.selector, 'amaf', False)
+        if amaf and table is not None:
+            raise ValueError("RAVE reads moves from parent_action, which a transposition table makes ambiguous")
+        if pool is not None:
+            if table is not None:
+                raise ValueError("a NodePool cannot prune nodes that a transposition table shares")
+            pool.attach(root_node)
+        iterations = 0
+        tree_size = 1
+        proven_hits = 0
+        while ((max_nodes is None or tree_size < max_nodes and proven_hits < max_nodes)
+               and root_node.proven is None):
+            if pool is not None and pool.full() and not pool.prune(root_node):
+                break
+            path = [] if table is not None or amaf else None
+            if record is not None:
+                mark = clock()
+            new_leaf, new_state = self.selector.select(root_node, board, state, identity_of_bot, path)
+            if record is not None:
+                now = clock()
+                record['select_seconds'] += now - mark
+                mark = now
+            if new_leaf.proven is not None:
+                # Nothing left to learn below a proven node: count its exact result without a rollout. Selection
+                # skips proven losses, so these are mostly draws; they add no node and so leave the cap alone, but
+                # as many again as the cap end the search, in case no unproven leaf is left within reach.
+                backpropagate(new_leaf, new_leaf.proven, 1, path)
+                new_node = new_leaf
+                proven_hits += 1
+            else:
+                tree_size += 1
+                new_node, new_state = expand_leaf(new_leaf, board, new_state, table, make_node)
+                if path is not None and new_node is not new_leaf:
+                    path.append(new_node)
+                if solver is not None and new_node.proven is None:
+                    self.try_prove(new_node, board, new_state, identity_of_bot)
+                if record is not None:
+                    now = clock()
+                    record['expand_seconds'] += now - mark
+                    mark = now
+                    moves = board.next_state_calls + board.apply_calls
+                played = [] if amaf else None
+                if new_node.proven is not None:
+                    won, visits = new_node.proven, 1
+                else:
+                    if amaf:
+                        won, visits = self.rollout(board, new_state, identity_of_bot, played)
+                    else:
+                        won, visits = self.rollout(board, new_state, identity_of_bot)
+                    if record is not None:
+                        record['rollouts'] += visits
+                        record['rollout_moves'] += board.next_state_calls + board.apply_calls - moves
+                if record is not None:
+                    now = clock()
+                    record['rollout_seconds'] += now - mark
+                    mark = now
+                backpropagate(new_node, won, visits, path)
+                if amaf:
+                    self.selector.update(path, played, won, visits)
+            if record is not None:
+                record['backprop_seconds'] += clock() - mark
+                depth = len(path) - 1 if path is not None else node_depth(new_node, root_node)
+                if depth > record['max_depth']:
+                    record['max_depth'] = depth
+            iterations += 1
+            if iterations % check_every == 0 and ((deadline is not None and time.perf_counter() >= deadline)
+                                                   or (cancel is not None and cancel.is_set())):
+                break
+
+        seconds = time.perf_counter() - start
+        stats = {
+            'iterations': iterations,
+            'seconds': seconds,
+            'iterations_per_second': iterations / seconds if seconds > 0 else 0.,
+        }
+        if table is not None:
+            stats.update(table.stats())
+        if hasattr(self.rollout, 'stats'):
+            stats.update(self.rollout.stats())
+        if pool is not None:
+            stats.update(pool.stats())
+        if solver is not None:
+            stats.update(solver.stats())
+            stats['proven'] = root_node.proven
+            stats['proven_hits'] = proven_hits
+        if record is not None:
+            self.profile.finish(record, root_node, iterations, seconds)
+        self.last_search = stats
+        return root_node, stats
+
+    def try_prove(self, node, board, state, identity):
+        """ Marks node proven if its state is over or solvable, then passes the proof up as far as it settles.
+
+        A parent is proven once one child is a proven win for the player choosing there, or once all its actions
+        are tried and every child is proven, taking the value best for that player.
+        """
+        values = board.win_values(state)
+        if values is not None:
+            node.proven = values[identity]
+        elif self.solver.can_solve(state):
+            value = self.solver.solve(board, state)
+            node.proven = (1 + value) / 2. if state[-1] == identity else (1 - value) / 2.
+        else:
+            return
+
+        chooser = 3 - state[-1]
+        parent = node.parent
+        while parent is not None:
+            target = 1 if chooser == identity else 0
+            if node.proven != target:
+                if parent.untried_actions:
+                    return
+                results = [child.proven for child in parent.child_nodes.values()]
+                if None in results:
+                    return
+                target = max(results) if chooser == identity else min(results)
+            parent.proven = target
+            node = parent
+            parent = node.parent
+            chooser = 3 - chooser
+
+    def worker_copy(self):
+        """ Returns a copy with the same policies and budgets but none of the state built up by searching, to be
+        pickled to another process: a cached rollout becomes the policy it wraps, the table, solver memo and node
+        pool start empty, and nothing is profiled.
+        """
+        engine = copy.copy(self)
+        engine.rollout = getattr(self.rollout, 'inner', self.rollout)
+        if self.table is not None:
+            engine.table = TranspositionTable(self.table.max_entries)
+        if self.solver is not None:
+            engine.solver = EndgameSolver(self.solver.threshold, self.solver.max_entries)
+        if self.pool is not None:
+            engine.pool = NodePool(self.pool.limit, prune_fraction=self.pool.prune_fraction)
+        engine.profile = None
+        engine.last_search = {}
+        return engine
+
+    def best_action(self, node, board, state, identity):
+        # Once the root is proven, play the child that proved it rather than trusting the sampled win rates.
+        if node.proven is not None:
+            for action, child in node.child_nodes.items():
+                if child.proven == node.proven:
+                    return action
+        return self.final(node, board, state, identity)
+
+    def think(self, board, state):
+        """ Searches state with the object's defaults and returns the chosen action. """
+        # Table entries hold win counts for one side only.
+        if self.table is not None and board.current_player(state) != self.identity:
+            self.table.entries.clear()
+        self.identity = board.current_player(state)
+        root_node, _ = self.search(board, state)
+        action = self.best_action(root_node, board, state, board.current_player(state))
+        if self.pool is not None:
+            self.pool.release(root_node)    # The next search starts from scratch, so all of its nodes are free.
+        return action
+
+    __call__ = think
+
+
+def build(select='uct', rollout='random', final='max', **options):
+    """ Builds an MCTS object from policy names and options.
+
+    Args:
+        select:     Name of a selector in selectors.
+        rollout:    Name of a rollout policy in rollouts.
+        final:      Name of a final move choice in finals.
+        options:    c and k (selector), depth and playouts (rollout), nodes and ms (search defaults), and cache_mb to
+                    put a RolloutCache of about that many megabytes in front of the rollout, reusing entries once
+                    they hold cache_games playouts (4 by default), with cache_prime set to 1 to prime new nodes
+                    with every cached playout. solve=N adds an EndgameSolver for positions with at most N moves
+                    left, and profile=1 a profiling.SearchProfile. tree_nodes and tree_mb bound the tree with a
+                    NodePool holding at most that many nodes or megabytes.
+
+    Returns:    The MCTS object.
+
+    """
+    for kind, name, registry in (('select', select, selectors), ('rollout', rollout, rollouts),
+                                 ('final', final, finals)):
+        if name not in registry:
+            raise ValueError("%s=%s not in %s" % (kind, name, ','.join(registry.keys())))
+
+    selector_options = dict((key, options.pop(key)) for key in ('c', 'k') if key in options)
+    rollout_options = dict((key, options.pop(key)) for key in ('depth', 'playouts') if key in options)
+    max_nodes = options.pop('nodes', None)
+    time_budget_ms = options.pop('ms', None)
+    cache_mb = options.pop('cache_mb', None)
+    cache_games = options.pop('cache_games', 4)
+    cache_prime = options.pop('cache_prime', 0)
+    solve = options.pop('solve', 0)
+    profile = options.pop('profile', 0)
+    tree_nodes = options.pop('tree_nodes', None)
+    tree_mb = options.pop('tree_mb', None)
+    if options:
+        raise ValueError("unknown MCTS options: " + ','.join(options.keys()))
+    if getattr(selectors[select], 'amaf', False) and (rollout == 'batch' or cache_mb):
+        raise ValueError("select=%s needs the moves of each playout: rollout=random, heuristic or cutoff, no cache"
+                         % select)
+
+    rollout_policy = rollouts[rollout](**rollout_options)
+    if cache_mb:
+        rollout_policy = CachedRollout(rollout_policy, RolloutCache(max_bytes=int(cache_mb * (1 << 20))),
+                                       max(1, int(cache_games)), bool(cache_prime))
+    engine = MCTS(selectors[select](**selector_options), rollout_policy, finals[final](),
+                  max_nodes=max_nodes, time_budget_ms=time_budget_ms,
+                  solver=EndgameSolver(solve) if solve else None)
+    if tree_nodes or tree_mb:
+        engine.pool = NodePool(tree_nodes or None, int(tree_mb * (1 << 20)) if tree_mb else None)
+    if profile:
+        engine.profile = SearchProfile()
+    return engine
@@ -1,85 +1,90 @@
 import random
-import time
-
-from mcts_node import MCTSNode
 from random import choice
-from math import sqrt, log
+
+import mcts_vanilla
+from mcts_vanilla import traverse_nodes, expand_leaf, backpropagate, best_action
+from p2_t3 import free_cells, winning_cells
 
 num_nodes = 200
-explore_faction = 2.
+time_budget_ms = None   # Per-move wall-clock budget; None searches a fixed num_nodes.
+rollout_depth = None    # Moves per playout before evaluator.state_value scores the position; None plays to the end.
 
 
-def traverse_nodes(node, board, state, identity):
-    """ Traverses the tree until the end criterion are met.
+def tactical_action(state):
+    """ Finds the most urgent "obviously right" move in state using the winning_cells masks.
+
+    In order of preference: win a sub-board that wins the game, block the opponent from doing so, win any
+    sub-board, block the opponent from winning any sub-board.
 
     Args:
-        node:       A tree node from which the search is traversing.
-        board:      The game setup.
-        state:      The state of the game.
-        identity:   The bot's identity, either 'red' or 'blue'.
+        state:  The state of the game.
 
-    Returns:        A node from which the next stage of the search can proceed.
+    Returns:    The action, or None if no move completes or blocks a three-in-a-row.
 
     """
-    current = node
-    # if current.visits == 0: #if no vists, then add leafs
-    #     for action in current.untried_actions:
-    #         next_state = board.next_state(state, action)
-    #         expanded_leaf = expand_leaf(current, board, next_state)
-    #         expanded_leaf.parent_action = action
-    #         expanded_leaf.untried_actions = board.legal_actions(next_state)
-    #         node.child_nodes[action] = expanded_leaf
-
-    greatest_child = None
-    greatest_UCT = 0
-    # Checking for nonvisited children
-    # for c in current.child_nodes.values():
-    #     if c.visits == 0: #if not visited want to rollout this one
-    #         return c
-    if current.untried_actions:
-        return (current, state)
-    if len(current.child_nodes) == 0:
-        return (current, state)
-    for child in current.child_nodes.values():
-        if identity == board.current_player(state):
-            current_UCT = child.wins / child.visits + explore_faction * (sqrt(log(current.visits) / child.visits))
-        else:
-            current_UCT = (1 - (child.wins / child.visits)) + explore_faction * (
-                sqrt(log(current.visits) / child.visits))
-
-        if current_UCT > greatest_UCT:
-            greatest_child = child
-            greatest_UCT = current_UCT
-        # if(current_UCT == 0):
-        #     greatest_child = child
-
-    next_state = board.next_state(state, greatest_child.parent_action)
-    return traverse_nodes(greatest_child, board, next_state, identity)
-
-
-def expand_leaf(node, board, state):
-    """ Adds a new leaf to the tree by creating a new child node for the given node.
+    me = state[-1] - 1
+    opponent = 1 - me
+    closed = state[18] | state[19]
+    game_winning = winning_cells[state[18 + me] & ~state[18 + opponent]] & ~closed
+    game_losing = winning_cells[state[18 + opponent] & ~state[18 + me]] & ~closed
+
+    if state[20] is None:
+        outers = [outer for outer in range(9) if not closed & (1 << outer)]
+    else:
+        outers = [3 * state[20] + state[21]]
+
+    best, best_rank = None, 4
+    for outer in outers:
+        mine, theirs = state[2 * outer + me], state[2 * outer + opponent]
+        free = 0x1ff & ~(mine | theirs)
+        completing = winning_cells[mine] & free
+        if completing:
+            if game_winning & (1 << outer):
+                r, c = choice(free_cells[0x1ff ^ completing])
+                return outer // 3, outer % 3, r, c
+            if best_rank > 2:
+                best, best_rank = (outer, completing), 2
+        blocking = winning_cells[theirs] & free
+        if blocking:
+            rank = 1 if game_losing & (1 << outer) else 3
+            if rank < best_rank:
+                best, best_rank = (outer, blocking), rank
+
+    if best is None:
+        return None
+    outer, cells = best
+    r, c = choice(free_cells[0x1ff ^ cells])
+    return outer // 3, outer % 3, r, c
+
+
+def rollout(board, state, moves=None, depth=None):
+    """ Given the state of the game, the rollout plays out the remainder, taking the move tactical_action finds
+    when there is one and a random move otherwise.
 
     Args:
-        node:   The node for which a child will be added.
         board:  The game setup.
         state:  The state of the game.
+        moves:  If a list, every action played is appended to it.
+        depth:  If set, the rollout stops after this many moves, possibly before the game ends.
 
-    Returns:    The added child node.
+    Returns:    The final state.
 
     """
-    if not node.untried_actions:
-        return node, state
-    random_action = choice(node.untried_actions)
-    new_state = board.next_state(state, random_action)
-    new_node = MCTSNode(node, random_action, board.legal_actions(new_state))
-    node.child_nodes[random_action] = new_node
-    node.untried_actions.remove(random_action)
-    return new_node, new_state
-
-
-def rollout(board, state):
-    """ Given the state of the game, the rollout plays out the remainder randomly.
+    state = list(state)     # Copied once, then the moves are played in place.
+    steps = -1 if depth is None else depth      # Counting down from -1 never reaches 0.
+    while steps and not board.is_ended(state):
+        action = tactical_action(state)
+        if action is None:
+            action = choice(board.legal_actions(state))
+        board.apply(state, action)
+        if moves is not None:
+            moves.append(action)
+        steps -= 1
+    return tuple(state)
+
+
+def legacy_rollout(board, state):
+    """ The original line-counting heuristic rollout, kept for comparison in p2_bench.py.
 
     Args:
         board:  The game setup.
@@ -153,41 +158,21 @@ def will_complete(action, lines):
         return True
     return False
 
-def backpropagate(node, won):
-    """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
-
-    Args:
-        node:   A leaf node.
-        won:    An indicator of whether the bot won or lost the game.
 
+def search(board, state, root_node=None, max_nodes=None, time_budget_ms=None, batch_size=1, table=None):
+    """ Runs mcts_vanilla.search with the heuristic rollout; see there for the arguments and return value. The
+    heuristic rollout has no batched form, so batch_size above 1 raises ValueError.
     """
-    # Update win scores
-    current_node = node
-    while current_node:
-        current_node.wins += won
-        current_node.visits += 1
-        current_node = current_node.parent
-    pass
-
-
-def best_action(node, board, state, identity):
-    greatest_winrate = 0
-    current_winrate = 0
-    greatest_child = None
-
-    for child in node.child_nodes.values():
-        # UCT = wi/ni + c(sqrt(ln t/ni))
-        # if(child.visits == 0):
-        #     return child.parent_action
-        current_winrate = child.wins / child.visits
-        if current_winrate > greatest_winrate:
-            greatest_child = child
-            greatest_winrate = current_winrate
-    return greatest_child.parent_action
+    if batch_size > 1:
+        raise ValueError("the heuristic rollout has no batched form: batch_size must be 1")
+    if max_nodes is None and time_budget_ms is None:
+        max_nodes = num_nodes
+    return mcts_vanilla.search(board, state, root_node, max_nodes, time_budget_ms, rollout=rollout,
+                               batch_size=batch_size, table=table, depth=rollout_depth)
 
 
 def think(board, state):
-    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+    """ Performs MCTS with the heuristic rollout, for num_nodes nodes or against time_budget_ms if it is set.
 
     Args:
         board:  The game setup.
@@ -197,30 +182,5 @@ def think(board, state):
 
     """
     identity_of_bot = board.current_player(state)
-    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(state))
-
-    # Copy the game for sampling a playthrough
-    sampled_game = state
-    # Start at root
-    node = root_node
-
-    # Do MCTS - This is all you!
-    # while tree size, eventually replace with timer
-    total_score = 0
-    tree_size = 1
-    # timer = 0.1 + time.time()
-    # while time.time() < timer:
-    while tree_size < num_nodes:
-        # print(tree_size)
-        new_leaf, new_state = traverse_nodes(node, board, state, identity_of_bot)  # add state for current layer
-        # expand leaf here
-        new_node, new_state = expand_leaf(new_leaf, board, new_state)
-        # next_state = board.next_state(state, leaf.parent_action)
-        simulated = rollout(board, new_state)  # use state returned from expand leaf
-        score_to_update = board.win_values(simulated)[identity_of_bot]
-        total_score += score_to_update
-        backpropagate(new_node, score_to_update)  # need to update wins correctly
-        tree_size += 1
-    #print(tree_size)
-    action_to_take = best_action(node, board, state, identity_of_bot)
-    return action_to_take
\ No newline at end of file
+    root_node, _ = search(board, state, time_budget_ms=time_budget_ms)
+    return best_action(root_node, board, state, identity_of_bot)
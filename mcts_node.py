@@ -1,24 +1,29 @@
 
 
 class MCTSNode:
-    def __init__(self, parent=None, parent_action=None, action_list=[]):
+    # Fixed attribute slots instead of a per-node __dict__ keep large trees compact and attribute access fast.
+    __slots__ = ('parent', 'parent_action', 'child_nodes', 'untried_actions', 'wins', 'visits', 'proven', 'amaf')
+
+    def __init__(self, parent=None, parent_action=None, action_list=None):
         """ Initializes the tree node for MCTS. The node stores links to other nodes in the tree (parent and child
         nodes), as well as keeps track of the number of wins and total simulations that have visited the node.
 
         Args:
             parent:         The parent node of this node.
             parent_action:  The action taken from the parent node that transitions the state to this node.
-            action_list:    The list of legal actions to be considered at this node.
+            action_list:    The list of legal actions to be considered at this node, empty if None.
 
         """
         self.parent = parent                    # Parent node to this node
         self.parent_action = parent_action      # The move that got us to this node - "None" for the root node.
 
         self.child_nodes = {}                   # Action -> MCTSNode dictionary of children
-        self.untried_actions = action_list      # Yet unexplored actions
+        self.untried_actions = action_list if action_list is not None else []  # Yet unexplored actions
 
         self.wins = 0                           # Total wins of all paths through this node.
         self.visits = 0                         # Number of times this node has been visited.
+        self.proven = None                      # Exact result for the searching bot (1, 0.5 or 0) once solved.
+        self.amaf = None                        # RAVE only: action -> [wins, visits] of playouts that played it later.
 
     def __repr__(self):
         """
@@ -0,0 +1,272 @@
+import multiprocessing
+import multiprocessing.pool
+import os
+import random
+import time
+import types
+from importlib import import_module
+
+import p2_t3
+import mcts_vanilla
+from mcts_node import MCTSNode
+from mcts_vanilla import expand_leaf, backpropagate
+
+
+def search_root(strategy, state, seed, max_nodes, time_budget_ms):
+    """ Runs one independent search in a worker process.
+
+    Args:
+        strategy:       Module name of the strategy, e.g. 'mcts_vanilla', or a picklable object with search(),
+                        such as an mcts_engine.MCTS.
+        state:          The state to search from.
+        seed:           Seed for this worker's random number generator.
+        max_nodes:      Cap on the tree size, see mcts_vanilla.search().
+        time_budget_ms: Wall-clock budget, see mcts_vanilla.search().
+
+    Returns:    A dict mapping each root action to its (wins, visits), and the number of iterations run.
+
+    """
+    random.seed(seed)
+    if isinstance(strategy, str):
+        strategy = import_module(strategy)
+    root, stats = strategy.search(p2_t3.Board(), state, None, max_nodes, time_budget_ms)
+    counts = dict((action, (child.wins, child.visits)) for action, child in root.child_nodes.items())
+    return counts, stats['iterations']
+
+
+class RootParallelBot:
+    def __init__(self, strategy=mcts_vanilla, workers=None, max_nodes=None, time_budget_ms=None, seed=None):
+        """ An MCTS player that runs independent searches of the same state in a process pool.
+
+        The root children's wins and visits from every worker are summed before the strategy's best_action()
+        picks the move. The pool is created on the first move and reused for the following ones. An MCTS
+        object is sent to the workers as its worker_copy(), so no rollout cache or table travels with each job.
+
+        Args:
+            strategy:       Module or object providing search() and best_action(), e.g. mcts_vanilla or an
+                            mcts_engine.MCTS.
+            workers:        Number of worker processes, defaulting to the number of CPUs.
+            max_nodes:      Cap on the nodes each worker grows per move.
+            time_budget_ms: Wall-clock budget per move for each worker.
+            seed:           Seed for the per-worker seeds. If None they are drawn from the random module, so a
+                            game seeded with random.seed() replays with the same searches.
+
+        """
+        self.strategy = strategy
+        self.workers = workers or os.cpu_count() or 1
+        self.max_nodes = max_nodes
+        self.time_budget_ms = time_budget_ms
+        self.rng = random.Random(seed) if seed is not None else random
+
+        if isinstance(strategy, types.ModuleType):
+            self.worker_strategy = strategy.__name__
+        elif hasattr(strategy, 'worker_copy'):
+            self.worker_strategy = strategy.worker_copy()
+        else:
+            self.worker_strategy = strategy
+
+        self.pool = None
+        self.last_search = {}
+
+    def think(self, board, state):
+        """ Searches state in every worker, merges the root statistics and returns the chosen action.
+
+        Args:
+            board:  The game setup.
+            state:  The state of the game.
+
+        Returns:    The action to be taken.
+
+        """
+        if self.pool is None:
+            # multiprocessing.Pool rather than a ProcessPoolExecutor: it terminates its workers from a
+            # multiprocessing finalizer, so a tournament worker process owning the bot can still exit.
+            self.pool = multiprocessing.Pool(self.workers)
+
+        futures = [
+            self.pool.apply_async(search_root, (self.worker_strategy, state, self.rng.getrandbits(32),
+                                                self.max_nodes, self.time_budget_ms))
+            for _ in range(self.workers)
+        ]
+
+        root = MCTSNode(parent=None, parent_action=None, action_list=[])
+        iterations = 0
+        for future in futures:
+            counts, worker_iterations = future.get()
+            iterations += worker_iterations
+            for action, (wins, visits) in counts.items():
+                child = root.child_nodes.get(action)
+                if child is None:
+                    child = root.child_nodes[action] = MCTSNode(root, action, [])
+                child.wins += wins
+                child.visits += visits
+                root.visits += visits
+
+        self.last_search = {'iterations': iterations, 'workers': self.workers}
+        return self.strategy.best_action(root, board, state, board.current_player(state))
+
+    def close(self):
+        """ Shuts down the worker pool. """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    __call__ = think
+
+
+def seed_worker(seed):
+    """ Pool initializer giving each rollout worker its own random sequence. """
+    random.seed(seed + os.getpid())
+
+
+def rollout_leaf(rollout, state, identity, playouts):
+    """ Runs playouts rollouts from state in a worker. Returns identity's total score and the playout count. """
+    board = p2_t3.Board()
+    won = visits = 0
+    for _ in range(playouts):
+        leaf_won, leaf_visits = rollout(board, state, identity)
+        won += leaf_won
+        visits += leaf_visits
+    return won, visits
+
+
+class TreeParallelBot:
+    def __init__(self, engine=None, workers=None, virtual_loss=1, leaf_playouts=1, max_nodes=None,
+                 time_budget_ms=None, threads=False, seed=None):
+        """ An MCTS player that grows one shared tree while several rollouts run at once.
+
+        The tree stays in this process. Up to twice workers leaves are out for rollout at any time, each
+        selected with the engine's selector and sent to a pool together with the rollout policy. Every node on
+        a pending leaf's path is charged virtual_loss lost playouts, so the UCT scores of traverse_nodes steer
+        the next selections elsewhere until the real results come back and the virtual ones are taken off.
+
+        Args:
+            engine:         An mcts_engine.MCTS supplying the selector, rollout and final move choice; a default
+                            one if None. Nothing else of it is used: no table, solver, node pool, profile, rollout
+                            cache or AMAF updates.
+            workers:        Pool size, defaulting to the number of CPUs.
+            virtual_loss:   Lost playouts charged per pending rollout; at least 1, so pending nodes have visits.
+            leaf_playouts:  Rollouts run for each selected leaf (leaf parallelism within one job).
+            max_nodes:      Cap on the nodes grown per move.
+            time_budget_ms: Wall-clock budget per move.
+            threads:        Use a thread pool instead of processes. Rollouts are pure Python, so threads only
+                            interleave under the GIL; this is for comparison and for platforms without fork.
+            seed:           Base seed for the workers' random sequences.
+
+        """
+        import mcts_engine  # Deferred like mcts_vanilla.search: mcts_engine imports mcts_vanilla.
+
+        if virtual_loss < 1:
+            raise ValueError("virtual_loss must be at least 1")
+        self.engine = engine or mcts_engine.MCTS()
+        self.workers = workers or os.cpu_count() or 1
+        self.virtual_loss = virtual_loss
+        self.leaf_playouts = leaf_playouts
+        self.max_nodes = max_nodes
+        self.time_budget_ms = time_budget_ms
+        self.threads = threads
+        self.seed = random.getrandbits(32) if seed is None else seed
+
+        # The pool runs the bare policy: a rollout cache would be copied to the workers with every job.
+        self.rollout = getattr(self.engine.rollout, 'inner', self.engine.rollout)
+        self.pool = None
+        self.last_search = {}
+
+    def charge(self, path, sign):
+        """ Adds (sign 1) or removes (sign -1) the virtual loss on every node of path.
+
+        Nodes at odd depths were chosen by the bot, so a loss adds no wins there; at even depths the opponent
+        chose, and its loss is a win in the bot's counts.
+        """
+        loss = sign * self.virtual_loss
+        for depth, node in enumerate(path):
+            node.visits += loss
+            if depth % 2 == 0:
+                node.wins += loss
+
+    def search(self, board, state, root_node=None, max_nodes=None, time_budget_ms=None):
+        """ Grows the shared tree below root_node until the node cap or the deadline is reached.
+
+        Returns:        The root node and a dict of search statistics.
+
+        """
+        if self.pool is None:
+            if self.threads:
+                self.pool = multiprocessing.pool.ThreadPool(self.workers)
+            else:
+                self.pool = multiprocessing.Pool(self.workers, seed_worker, (self.seed,))
+
+        identity = board.current_player(state)
+        if root_node is None:
+            root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(state))
+        if max_nodes is None and time_budget_ms is None:
+            max_nodes, time_budget_ms = self.max_nodes, self.time_budget_ms
+            if max_nodes is None and time_budget_ms is None:
+                max_nodes = mcts_vanilla.num_nodes
+
+        start = time.perf_counter()
+        deadline = None if time_budget_ms is None else start + time_budget_ms / 1000.
+        in_flight = 2 * self.workers
+        pending = []
+        iterations = 0
+        submitted = 0
+        stopping = False
+        while True:
+            while not stopping and len(pending) < in_flight:
+                path = []
+                leaf, leaf_state = self.engine.selector.select(root_node, board, state, identity, path)
+                node, node_state = expand_leaf(leaf, board, leaf_state)
+                submitted += 1
+                if node is leaf:
+                    # Only a finished game has nothing left to expand: score it here rather than in the pool.
+                    backpropagate(node, board.win_values(node_state)[identity], 1, path)
+                    iterations += 1
+                else:
+                    path.append(node)
+                    self.charge(path, 1)
+                    job = self.pool.apply_async(rollout_leaf,
+                                                (self.rollout, node_state, identity, self.leaf_playouts))
+                    pending.append((job, path))
+                stopping = ((max_nodes is not None and submitted + 1 >= max_nodes) or
+                            (deadline is not None and time.perf_counter() >= deadline))
+
+            if not pending:
+                break
+            pending[0][0].wait()
+            still_pending = []
+            for job, path in pending:
+                if job.ready():
+                    won, visits = job.get()
+                    self.charge(path, -1)
+                    backpropagate(path[-1], won, visits, path)
+                    iterations += 1
+                else:
+                    still_pending.append((job, path))
+            pending = still_pending
+
+        seconds = time.perf_counter() - start
+        self.last_search = {
+            'iterations': iterations,
+            'seconds': seconds,
+            'iterations_per_second': iterations / seconds if seconds > 0 else 0.,
+            'workers': self.workers,
+        }
+        return root_node, self.last_search
+
+    def best_action(self, node, board, state, identity):
+        return self.engine.best_action(node, board, state, identity)
+
+    def think(self, board, state):
+        """ Searches state with the bot's defaults and returns the chosen action. """
+        root_node, _ = self.search(board, state)
+        return self.best_action(root_node, board, state, board.current_player(state))
+
+    def close(self):
+        """ Shuts down the rollout pool. """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    __call__ = think
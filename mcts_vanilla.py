@@ -1,6 +1,5 @@
 import math
 import random
-import time
 
 from mcts_node import MCTSNode
 from random import choice
@@ -8,52 +7,102 @@ from math import sqrt, log
 
 num_nodes = 100
 explore_faction = 2.
+time_budget_ms = None   # Per-move wall-clock budget; None searches a fixed num_nodes.
+check_every = 16        # Iterations between clock checks when searching against a deadline.
+rollout_depth = None    # Moves per playout before evaluator.state_value scores the position; None plays to the end.
 
-def traverse_nodes(node, board, state, identity):
+last_search = {}        # Statistics of the most recent search, see search().
+
+# sqrt(log(n)) and 1 / sqrt(n) for small visit counts, so UCT scores in selection are mostly table lookups.
+table_size = 1 << 16
+sqrt_log_table = [0.] + [sqrt(log(n)) for n in range(1, table_size)]
+inv_sqrt_table = [0.] + [1 / sqrt(n) for n in range(1, table_size)]
+
+
+def traverse_nodes(node, board, state, identity, path=None, explore=None):
     """ Traverses the tree until the end criterion are met.
 
+    The walk is iterative: log(visits) is looked up once per node, and the moves are replayed onto one list
+    that is turned back into a state tuple only at the end. Hashed states go through next_state instead, which
+    keeps their Zobrist hash up to date. The walk ends at a proven node (see mcts_engine.MCTS): a child proven won
+    for the player to move is taken at once, and children proven lost are never chosen.
+
     Args:
         node:       A tree node from which the search is traversing.
         board:      The game setup.
         state:      The state of the game.
         identity:   The bot's identity, either 'red' or 'blue'.
+        path:       If a list, every node visited is appended to it, for backpropagating along the path taken.
+        explore:    The exploration constant, explore_faction if None.
 
-    Returns:        A node from which the next stage of the search can proceed.
+    Returns:        A node from which the next stage of the search can proceed, and its state.
 
     """
+    if explore is None:
+        explore = explore_faction
     current = node
-    greatest_child = None
-    greatest_UCT = -math.inf
-    #Checking for nonvisited children
-    # for c in current.child_nodes.values():
-    #     if c.visits == 0: #if not visited want to rollout this one
-    #         return c
-    if current.untried_actions:
-        return (current, state)
-    if len(current.child_nodes) == 0:
-        return (current, state)
-    for child in current.child_nodes.values():
-        if identity == board.current_player(state):
-            current_UCT = child.wins/child.visits + explore_faction * (sqrt(log(current.visits) / child.visits))
+    buffer = None
+    hashed = hasattr(state, 'zobrist')
+    player = state[-1]
+    while True:
+        if path is not None:
+            path.append(current)
+        if current.untried_actions or not current.child_nodes or current.proven is not None:
+            break
+
+        visits = current.visits
+        scale = explore * (sqrt_log_table[visits] if visits < table_size else sqrt(log(visits)))
+        mine = identity == player
+        won = 1 if mine else 0
+        greatest_child = None
+        greatest_action = None
+        greatest_UCT = -math.inf
+        for action, child in current.child_nodes.items():
+            if child.proven is not None:
+                # Take a proven win for the player to move at once, and never walk into a proven loss.
+                if child.proven == won:
+                    greatest_child = child
+                    greatest_action = action
+                    break
+                if child.proven == 1 - won:
+                    continue
+            n = child.visits
+            win_rate = child.wins / n
+            if not mine:
+                win_rate = 1 - win_rate
+            current_UCT = win_rate + scale * (inv_sqrt_table[n] if n < table_size else 1 / sqrt(n))
+            if current_UCT > greatest_UCT:
+                greatest_child = child
+                greatest_action = action
+                greatest_UCT = current_UCT
+        if greatest_child is None:
+            break
+
+        # Use the edge's action: with a transposition table a child can be shared by several parents.
+        if hashed:
+            state = board.next_state(state, greatest_action)
+            player = state[-1]
         else:
-            current_UCT = (1-(child.wins/child.visits)) + explore_faction * (sqrt(log(current.visits) / child.visits))
-        
-        if current_UCT > greatest_UCT:
-            greatest_child = child
-            greatest_UCT = current_UCT
-    if not greatest_child:
+            if buffer is None:
+                buffer = list(state)
+            board.apply(buffer, greatest_action)
+            player = buffer[-1]
+        current = greatest_child
+
+    if buffer is None:
         return (current, state)
-    next_state = board.next_state(state, greatest_child.parent_action)
-    return traverse_nodes(greatest_child, board, next_state, identity)
-    
+    return (current, tuple(buffer))
+
 
-def expand_leaf(node, board, state):
+def expand_leaf(node, board, state, table=None, make_node=MCTSNode):
     """ Adds a new leaf to the tree by creating a new child node for the given node.
 
     Args:
-        node:   The node for which a child will be added.
-        board:  The game setup.
-        state:  The state of the game.
+        node:       The node for which a child will be added.
+        board:      The game setup.
+        state:      The state of the game.
+        table:      An optional TranspositionTable; if the new state is in it, its node becomes the child.
+        make_node:  Creates the child, MCTSNode or a node_pool.NodePool.
 
     Returns:    The added child node.
 
@@ -62,63 +111,123 @@ def expand_leaf(node, board, state):
         return node, state
     random_action = choice(node.untried_actions)
     new_state = board.next_state(state, random_action)
-    new_node = MCTSNode(node, random_action, board.legal_actions(new_state))
+    new_node = table.get(new_state) if table is not None else None
+    if new_node is None:
+        new_node = make_node(node, random_action, board.legal_actions(new_state))
+        if table is not None:
+            table.put(new_state, new_node)
     node.child_nodes[random_action] = new_node
     node.untried_actions.remove(random_action)
     return new_node, new_state
     
 
-def rollout(board, state):
+def rollout(board, state, moves=None, depth=None):
     """ Given the state of the game, the rollout plays out the remainder randomly.
 
     Args:
         board:  The game setup.
         state:  The state of the game.
+        moves:  If a list, every action played is appended to it (for RAVE, see mcts_engine.RAVE).
+        depth:  If set, the rollout stops after this many moves, possibly before the game ends.
+
+    Returns:    The final state.
 
     """
-    current_state = state #state
-    while not board.is_ended(current_state):
+    current_state = list(state)     # Copied once, then the moves are played in place.
+    steps = -1 if depth is None else depth      # Counting down from -1 never reaches 0.
+    while steps and not board.is_ended(current_state):
         possible_actions = board.legal_actions(current_state)
         action_to_take = random.choice(possible_actions)
-        current_state = board.next_state(current_state, action_to_take)
-    return current_state
+        board.apply(current_state, action_to_take)
+        if moves is not None:
+            moves.append(action_to_take)
+        steps -= 1
+    return tuple(current_state)
 
 
-def backpropagate(node, won):
+def backpropagate(node, won, visits=1, path=None):
     """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
 
     Args:
         node:   A leaf node.
-        won:    An indicator of whether the bot won or lost the game.
+        won:    An indicator of whether the bot won or lost the game, or the total over a batch of playouts.
+        visits: The number of playouts won summarizes.
+        path:   The nodes from the root to node as selected; followed instead of parent links when given.
 
     """
+    if path is not None:
+        for current_node in path:
+            current_node.wins += won
+            current_node.visits += visits
+        return
+
     #Update win scores
     current_node = node
     while current_node:
         current_node.wins += won
-        current_node.visits += 1
+        current_node.visits += visits
         current_node = current_node.parent
     pass
 
 def best_action(node, board, state, identity):
     greatest_winrate = -math.inf
     current_winrate = 0
-    greatest_child = None
+    greatest_action = None
 
-    for child in node.child_nodes.values():
+    for action, child in node.child_nodes.items():
         # UCT = wi/ni + c(sqrt(ln t/ni))
         # if(child.visits == 0):
         #     return child.parent_action
         current_winrate = child.wins/child.visits
         if current_winrate > greatest_winrate:
-            greatest_child = child
+            greatest_action = action
             greatest_winrate = current_winrate
-    return greatest_child.parent_action
+    return greatest_action
+
+
+def search(board, state, root_node=None, max_nodes=None, time_budget_ms=None, rollout=rollout, batch_size=1,
+           table=None, depth=None):
+    """ Grows the tree below root_node until the node cap or the deadline is reached, whichever comes first.
+
+    Args:
+        board:          The game setup.
+        state:          The state of the game at the root node.
+        root_node:      The tree to keep growing; a fresh root is created if None.
+        max_nodes:      Cap on the tree size. Defaults to num_nodes when no time budget is given.
+        time_budget_ms: Wall-clock budget in milliseconds, checked every check_every iterations.
+        rollout:        The playout function used to score new leaves.
+        batch_size:     Playouts per new leaf. Above 1 they run together in batch_rollout (needs numpy),
+                        which plays random moves only, so rollout is then not used.
+        table:          An optional TranspositionTable shared by positions reached through different move orders.
+        depth:          Moves per playout before the evaluator scores the position, rollout_depth if None.
+
+    Returns:        The root node and a dict of search statistics (iterations, seconds, iterations_per_second,
+                    plus the table's counters when a table is used).
+
+    """
+    import mcts_engine  # Deferred: mcts_engine builds its policies on this module.
+
+    if depth is None:
+        depth = rollout_depth
+    if batch_size > 1:
+        policy = mcts_engine.BatchRollout(batch_size, depth)
+    else:
+        policy = mcts_engine.RandomRollout(rollout, depth)
+    if max_nodes is None and time_budget_ms is None:
+        max_nodes = num_nodes
+
+    engine = mcts_engine.MCTS(mcts_engine.UCT(explore_faction), policy)
+    root_node, stats = engine.search(board, state, root_node, max_nodes, time_budget_ms, table)
+    last_search.clear()
+    last_search.update(stats)
+    return root_node, stats
 
 
 def think(board, state):
     """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
 
+    The search runs for num_nodes nodes, or against the per-move deadline if time_budget_ms is set.
+
     Args:
         board:  The game setup.
         state:  The state of the game.
@@ -127,31 +236,5 @@ def think(board, state):
 
     """
     identity_of_bot = board.current_player(state)
-    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(state))
-
-    # Copy the game for sampling a playthrough
-    sampled_game = state
-    # Start at root
-    node = root_node
-    node_amount = num_nodes
-    # if identity_of_bot == 1:
-    #     node_amount = 200
-    # Do MCTS - This is all you!
-    #while tree size, eventually replace with timer
-    tree_size = 1
-
-    # timer = 0.1 + time.time()
-    # while time.time() < timer:
-    while tree_size < num_nodes:
-        #print(tree_size)
-        new_leaf, new_state = traverse_nodes(node, board, state, identity_of_bot) #add state for current layer
-        #expand leaf here
-        new_node, new_state = expand_leaf(new_leaf, board, new_state)
-        #next_state = board.next_state(state, leaf.parent_action)
-        simulated = rollout(board, new_state) #use state returned from expand leaf
-        score_to_update = board.win_values(simulated)[identity_of_bot]
-        backpropagate(new_node, score_to_update) #need to update wins correctly
-        tree_size += 1
-    #print(tree_size)
-    action_to_take = best_action(node, board, state, identity_of_bot)
-    return action_to_take
\ No newline at end of file
+    root_node, _ = search(board, state, time_budget_ms=time_budget_ms)
+    return best_action(root_node, board, state, identity_of_bot)
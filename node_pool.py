@@ -0,0 +1,114 @@
+from mcts_node import MCTSNode
+from profiling import count_nodes
+
+# Average bytes held by a node of a searched tree, child dict and action list included (tracemalloc, 20000 nodes).
+node_bytes = 480
+
+
+class NodePool:
+    def __init__(self, max_nodes=None, max_bytes=None, prune_fraction=0.25):
+        """ Bounds the size of a search tree and recycles the nodes of pruned subtrees.
+
+        When the tree reaches the limit, prune() collapses the subtrees with the fewest visits into leaves until a
+        prune_fraction of the limit is free again. A collapsed node keeps its own wins and visits, so the
+        statistics of the nodes above it, the root's children included, are unchanged; its actions become untried
+        again and are expanded anew if the search comes back to it. Released nodes go to a free list, and new
+        nodes are taken from it before any are allocated, so the pool never holds more than the limit.
+
+        Args:
+            max_nodes:      Most nodes in the tree.
+            max_bytes:      Most memory for the tree, converted to nodes at node_bytes each.
+            prune_fraction: Share of the limit freed by each prune.
+
+        """
+        limits = []
+        if max_nodes is not None:
+            limits.append(int(max_nodes))
+        if max_bytes is not None:
+            limits.append(int(max_bytes // node_bytes))
+        if not limits:
+            raise ValueError("NodePool needs max_nodes or max_bytes")
+        self.limit = max(2, min(limits))
+        self.prune_fraction = prune_fraction
+        self.free = []
+
+        self.live = 0           # Nodes in the tree being searched.
+        self.allocated = 0      # Nodes ever created by the pool.
+        self.recycled = 0       # Nodes handed out again from the free list.
+        self.released = 0       # Nodes returned to the free list.
+        self.prunes = 0
+
+    def __call__(self, parent=None, parent_action=None, action_list=None):
+        """ Returns a node initialized like MCTSNode(parent, parent_action, action_list), recycled if possible. """
+        self.live += 1
+        if not self.free:
+            self.allocated += 1
+            return MCTSNode(parent, parent_action, action_list)
+        self.recycled += 1
+        node = self.free.pop()
+        node.parent = parent
+        node.parent_action = parent_action
+        node.untried_actions = action_list if action_list is not None else []
+        node.wins = 0
+        node.visits = 0
+        node.proven = None
+        node.amaf = None
+        return node
+
+    def attach(self, root):
+        """ Counts the nodes of the tree a search starts from, which may have been grown or cut elsewhere. """
+        self.live = count_nodes(root)
+
+    def full(self):
+        return self.live >= self.limit
+
+    def release(self, node):
+        """ Returns node and everything below it to the free list. node must already be unlinked from its parent. """
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            stack.extend(current.child_nodes.values())
+            current.child_nodes.clear()
+            current.parent = None
+            current.untried_actions = None
+            current.amaf = None
+            self.free.append(current)
+            self.live -= 1
+            self.released += 1
+
+    def collapse(self, node):
+        """ Releases node's descendants, making it a leaf that keeps its statistics. """
+        node.untried_actions.extend(node.child_nodes.keys())
+        children = list(node.child_nodes.values())
+        node.child_nodes.clear()
+        for child in children:
+            self.release(child)
+
+    def prune(self, root):
+        """ Collapses the lowest-visit subtrees below root until a prune_fraction of the limit is free.
+
+        Returns:    Whether the tree is below the limit afterwards; it is not if root has too many children.
+
+        """
+        internal = []
+        stack = list(root.child_nodes.values())
+        while stack:
+            node = stack.pop()
+            if node.child_nodes:
+                internal.append(node)
+                stack.extend(node.child_nodes.values())
+        # A node has more visits than any node below it, so subtrees are cut from the bottom up.
+        internal.sort(key=lambda node: node.visits)
+
+        target = int(self.limit * (1 - self.prune_fraction))
+        for node in internal:
+            if self.live <= target:
+                break
+            if node.parent is not None:     # Not already released with an ancestor.
+                self.collapse(node)
+        self.prunes += 1
+        return self.live < self.limit
+
+    def stats(self):
+        return {'tree_nodes': self.live, 'pool_free': len(self.free), 'pool_allocated': self.allocated,
+                'pool_recycled': self.recycled, 'pool_prunes': self.prunes}
@@ -0,0 +1,132 @@
+import argparse
+import mmap
+import struct
+
+import p2_t3
+import mcts_engine
+
+# File layout: a header, then fixed-size records sorted by hash so lookups can binary search the mapped file.
+header = struct.Struct('<8sII')         # magic, version, number of records
+record = struct.Struct('<Q4BIf')        # Zobrist hash, action (R, C, r, c), root visits, win rate of the action
+magic = b'UTTTBOOK'
+version = 1
+
+board = p2_t3.Board()
+
+
+def opening_positions(depth):
+    """ Returns every position reachable from the starting state in fewer than depth moves. """
+    positions = [board.starting_state()]
+    level = positions
+    for _ in range(depth - 1):
+        level = [board.next_state(state, action) for state in level for action in board.legal_actions(state)]
+        positions.extend(level)
+    return positions
+
+
+def build_book(path, depth=2, time_budget_ms=1000, engine=None, progress=None):
+    """ Searches every opening position deeply and writes the best action for each to a book file.
+
+    Args:
+        path:           File to write.
+        depth:          Positions with fewer than depth moves played are searched.
+        time_budget_ms: Search time per position.
+        engine:         The mcts_engine.MCTS to search with; a UCT/heuristic-rollout one if None.
+        progress:       Called with (done, total) after each position.
+
+    Returns:        The number of records written.
+
+    """
+    engine = engine or mcts_engine.build(rollout='heuristic', final='robust')
+    positions = opening_positions(depth)
+    entries = {}
+    for done, state in enumerate(positions, 1):
+        key = board.zobrist(state)
+        if key not in entries:
+            root, _ = engine.search(board, state, time_budget_ms=time_budget_ms)
+            action = engine.best_action(root, board, state, board.current_player(state))
+            child = root.child_nodes[action]
+            entries[key] = (action, root.visits, child.wins / child.visits)
+        if progress:
+            progress(done, len(positions))
+
+    with open(path, 'wb') as book_file:
+        book_file.write(header.pack(magic, version, len(entries)))
+        for key in sorted(entries):
+            action, visits, win_rate = entries[key]
+            book_file.write(record.pack(key, *action, visits, win_rate))
+    return len(entries)
+
+
+class OpeningBook:
+    def __init__(self, path):
+        """ A book file mapped into memory. Nothing is parsed up front; lookups binary search the mapping.
+
+        Args:
+            path:   A file written by build_book().
+
+        """
+        with open(path, 'rb') as book_file:
+            self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, file_version, self.count = header.unpack_from(self.data, 0)
+        if file_magic != magic or file_version != version:
+            raise ValueError("%s is not a version %d opening book" % (path, version))
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, key):
+        """ Returns (action, visits, win_rate) for the Zobrist hash key, or None if the book does not have it. """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = header.size + middle * record.size
+            found = struct.unpack_from('<Q', self.data, offset)[0]
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                _, R, C, r, c, visits, win_rate = record.unpack_from(self.data, offset)
+                return (R, C, r, c), visits, win_rate
+        return None
+
+    def close(self):
+        self.data.close()
+
+
+class BookPlayer:
+    def __init__(self, book, fallback):
+        """ Plays the book move in book positions and asks fallback everywhere else.
+
+        Args:
+            book:       An OpeningBook.
+            fallback:   A think function for positions not in the book.
+
+        """
+        self.book = book
+        self.fallback = fallback
+        self.hits = 0
+
+    def think(self, board, state):
+        entry = self.book.lookup(board.zobrist(state))
+        if entry is not None and board.is_legal(state, entry[0]):
+            self.hits += 1
+            return entry[0]
+        return self.fallback(board, state)
+
+    __call__ = think
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build an opening book by searching the first moves deeply.")
+    parser.add_argument('--out', default='opening_book.bin', help="book file to write")
+    parser.add_argument('--depth', type=int, default=2, help="search positions with fewer moves than this")
+    parser.add_argument('--ms', type=int, default=1000, help="search time per position in milliseconds")
+    args = parser.parse_args()
+
+    def report(done, total):
+        print("%d/%d positions" % (done, total))
+
+    written = build_book(args.out, args.depth, args.ms, progress=report)
+    print("Wrote %d positions to %s" % (written, args.out))
@@ -0,0 +1,686 @@
+import argparse
+import json
+import random
+import tracemalloc
+from time import sleep
+from timeit import default_timer as time
+
+import p2_t3
+import mcts_vanilla
+import mcts_modified
+import mcts_parallel
+import mcts_engine
+from mcts_node import MCTSNode
+
+board = p2_t3.Board()
+state0 = board.starting_state()
+
+
+def pinned_positions(plies=(0, 10, 20, 30, 40), seed=0):
+    """ Returns the positions a fixed-seed random game reaches after each number of plies in plies, so every
+    run measures the same early, middle and late game states. Games that end too soon are replayed.
+    """
+    rng = random.Random(seed)
+    while True:
+        positions = []
+        state = state0
+        for ply in range(max(plies) + 1):
+            if board.is_ended(state):
+                break
+            if ply in plies:
+                positions.append(state)
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+        else:
+            return positions
+
+
+def play_game(player1, player2):
+    """ Plays one game between two think functions and returns the final points_values. """
+    state = state0
+    current_player, other_player = player1, player2
+    while not board.is_ended(state):
+        state = board.next_state(state, current_player(board, state))
+        current_player, other_player = other_player, current_player
+    return board.points_values(state)
+
+
+def random_playouts(seconds=2.0, seed=0):
+    """ Plays uniformly random games from the starting state for a fixed amount of time.
+
+    Args:
+        seconds:    How long to keep playing games.
+        seed:       Seed for the move choices, so runs are comparable.
+
+    Returns:        A dict with the number of complete playouts per second.
+
+    """
+    rng = random.Random(seed)
+    games = 0
+    start = time()
+    while time() - start < seconds:
+        state = state0
+        while not board.is_ended(state):
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+        board.win_values(state)
+        games += 1
+    return {'playouts_per_second': games / (time() - start)}
+
+
+def zobrist_playouts(games=200, seed=0):
+    """ Plays random games on hashed states, whose Zobrist hash next_state updates move by move, and on plain
+    states hashed from scratch after every move (test_p2_t3.py checks that both agree).
+
+    Returns:        A dict with the moves played and the moves per second either way.
+
+    """
+    results = {}
+    for name, start_state, rehash in (('hashed', board.hashed(state0), None), ('scratch', state0, p2_t3.zobrist_hash)):
+        rng = random.Random(seed)
+        moves = 0
+        start = time()
+        for _ in range(games):
+            state = start_state
+            while not board.is_ended(state):
+                state = board.next_state(state, rng.choice(board.legal_actions(state)))
+                if rehash is not None:
+                    rehash(state)
+                moves += 1
+        results[name + '_moves_per_second'] = moves / (time() - start)
+    results['moves'] = moves
+    return results
+
+
+def mutable_playouts(games=200, seed=0):
+    """ Plays random games, then times playing each one again on a MutableState with do() and taking it all back
+    with undo() (test_p2_t3.py checks that these agree with next_state).
+
+    Returns:        A dict with the moves played and the do() and undo() pairs per second.
+
+    """
+    rng = random.Random(seed)
+    moves = 0
+    elapsed = 0.
+    for _ in range(games):
+        state = state0
+        actions = []
+        while not board.is_ended(state):
+            actions.append(rng.choice(board.legal_actions(state)))
+            state = board.next_state(state, actions[-1])
+        position = board.mutable(state0)
+        start = time()
+        for action in actions:
+            position.do(action)
+        for _ in actions:
+            position.undo()
+        elapsed += time() - start
+        moves += len(actions)
+    return {'moves': moves, 'do_undo_per_second': moves / elapsed}
+
+
+def batch_playouts(batch_sizes=(64, 1024, 16384), seconds=2.0, seed=0):
+    """ Plays random games from the starting state with batch_rollout for a fixed amount of time per batch size.
+
+    Returns:        A dict mapping 'batch_<n>_playouts_per_second' to complete playouts per second.
+
+    """
+    import numpy as np
+    import batch_rollout
+
+    rng = np.random.default_rng(seed)
+    results = {}
+    for batch_size in batch_sizes:
+        games = 0
+        start = time()
+        while time() - start < seconds:
+            batch_rollout.rollout_batch([state0], batch_size, rng)
+            games += batch_size
+        results['batch_%d_playouts_per_second' % batch_size] = games / (time() - start)
+    return results
+
+
+def best_rate(op, size, seconds, repeats=5):
+    """ Calls op, which does size units of work, for seconds in total split into repeats rounds, and returns the
+    best round's units per second; the best round is the least disturbed by other load on the machine.
+    """
+    best = 0.
+    for _ in range(repeats):
+        calls = 0
+        start = time()
+        while time() - start < seconds / repeats:
+            op()
+            calls += size
+        best = max(best, calls / (time() - start))
+    return best
+
+
+def board_ops(seconds=1.0):
+    """ Times Board.next_state, legal_actions, is_ended and win_values over the pinned positions, calling each
+    op for the given time.
+
+    Returns:        A dict with '<op>_per_second' for each op.
+
+    """
+    positions = pinned_positions()
+    moves = [(state, action) for state in positions for action in board.legal_actions(state)]
+    ops = dict(
+        next_state=lambda: [board.next_state(state, action) for state, action in moves],
+        legal_actions=lambda: [board.legal_actions(state) for state in positions],
+        is_ended=lambda: [board.is_ended(state) for state in positions],
+        win_values=lambda: [board.win_values(state) for state in positions],
+    )
+    sizes = dict(next_state=len(moves), legal_actions=len(positions), is_ended=len(positions),
+                 win_values=len(positions))
+
+    return dict((name + '_per_second', best_rate(op, sizes[name], seconds)) for name, op in ops.items())
+
+
+def rollout_speed(seconds=1.0, seed=0):
+    """ Runs the random and heuristic rollouts from each pinned position in turn for a fixed time per policy.
+
+    Returns:        A dict with '<policy>_rollouts_per_second'.
+
+    """
+    positions = pinned_positions()
+    results = {}
+    for name, rollout in (('random', mcts_vanilla.rollout), ('heuristic', mcts_modified.rollout)):
+        random.seed(seed)
+        results[name + '_rollouts_per_second'] = best_rate(
+            lambda: [rollout(board, state) for state in positions], len(positions), seconds)
+    return results
+
+
+def mcts_iterations(tree_sizes=(100, 1000, 10000), seed=0):
+    """ Grows a UCT/random-rollout search tree of each size from the pinned middle-game position.
+
+    Returns:        A dict with 'nodes_<n>_iterations_per_second' for each tree size.
+
+    """
+    state = pinned_positions()[2]
+    results = {}
+    for size in tree_sizes:
+        random.seed(seed)
+        _, stats = mcts_engine.MCTS().search(board, state, max_nodes=size)
+        results['nodes_%d_iterations_per_second' % size] = stats['iterations_per_second']
+    return results
+
+
+def build_tree(branching, depth, seed=0):
+    """ Builds a full tree of real positions with branching children per node down to depth, with random
+    statistics so selection has something to compare. Returns the root and the number of nodes.
+    """
+    rng = random.Random(seed)
+    root = MCTSNode(parent=None, parent_action=None, action_list=[])
+    size = 1
+    level = [(root, state0)]
+    for _ in range(depth):
+        next_level = []
+        for node, state in level:
+            for action in board.legal_actions(state)[:branching]:
+                child = node.child_nodes[action] = MCTSNode(node, action, [])
+                child.visits = rng.randint(1, 100)
+                child.wins = rng.randint(0, child.visits)
+                next_level.append((child, board.next_state(state, action)))
+                size += 1
+        level = next_level
+    root.visits = sum(child.visits for child in root.child_nodes.values())
+    return root, size
+
+
+def node_memory(nodes=100000):
+    """ Measures the bytes allocated per MCTSNode, including its child dict and action list, with tracemalloc.
+
+    Returns:        A dict with bytes per node.
+
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    root = MCTSNode(parent=None, parent_action=None, action_list=[])
+    for i in range(nodes - 1):
+        root.child_nodes[i] = MCTSNode(root, None, [])
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {'bytes_per_node': (after - before) / nodes}
+
+
+def bounded_tree(iterations=20000, limits=(None, 5000, 1000), seed=0):
+    """ Runs one long search from the start with no node limit and with NodePools of a few sizes.
+
+    Returns:        A dict with 'nodes_<limit>_peak_bytes', the peak traced memory of the search, and
+                    'nodes_<limit>_iterations_per_second' from an untraced run ('nodes_all' without a limit).
+
+    """
+    results = {}
+    for limit in limits:
+        name = 'nodes_%s' % (limit or 'all')
+        engine = mcts_engine.build(tree_nodes=limit)
+        random.seed(seed)
+        start = time()
+        engine.search(board, state0, max_nodes=iterations)
+        results[name + '_iterations_per_second'] = iterations / (time() - start)
+
+        engine = mcts_engine.build(tree_nodes=limit)
+        random.seed(seed)
+        tracemalloc.start()
+        engine.search(board, state0, max_nodes=iterations)
+        results[name + '_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return results
+
+
+def large_tree_selection(branching=7, depth=7, seconds=2.0, seed=0):
+    """ Runs mcts_vanilla.traverse_nodes from the root of a prebuilt tree of about 10**6 nodes.
+
+    Returns:        A dict with the tree size and the selections per second.
+
+    """
+    root, size = build_tree(branching, depth, seed)
+    selections = 0
+    start = time()
+    while time() - start < seconds:
+        mcts_vanilla.traverse_nodes(root, board, state0, 1)
+        selections += 1
+    return {'nodes': size, 'selections_per_second': selections / (time() - start)}
+
+
+def rollout_policies(seconds=2.0, games=4, time_budget_ms=100, seed=0):
+    """ Compares the random, legacy heuristic and bitmask heuristic rollouts: playouts per second from the
+    starting state, and the score of MCTS using each rollout against plain mcts_vanilla at the same per-move
+    budget, alternating colours.
+
+    Returns:        A dict with '<policy>_playouts_per_second' and '<policy>_score' in [-1, 1] for each policy.
+
+    """
+    policies = dict(
+        random=mcts_vanilla.rollout,
+        legacy=mcts_modified.legacy_rollout,
+        heuristic=mcts_modified.rollout,
+    )
+
+    def searcher(rollout):
+        def think(board, state):
+            root, _ = mcts_vanilla.search(board, state, time_budget_ms=time_budget_ms, rollout=rollout)
+            return mcts_vanilla.best_action(root, board, state, board.current_player(state))
+        return think
+
+    opponent = searcher(mcts_vanilla.rollout)
+    results = {}
+    for name, rollout in policies.items():
+        random.seed(seed)
+        playouts = 0
+        start = time()
+        while time() - start < seconds:
+            rollout(board, state0)
+            playouts += 1
+        results[name + '_playouts_per_second'] = playouts / (time() - start)
+
+        bot = searcher(rollout)
+        score = 0
+        for game in range(games):
+            if game % 2 == 0:
+                score += play_game(bot, opponent)[1]
+            else:
+                score += play_game(opponent, bot)[2]
+        results[name + '_score'] = score / games
+    return results
+
+
+def cutoff_rollouts(depths=(5, 10, 20), seconds=1.0, games=4, time_budget_ms=100, batch=1024, seed=0):
+    """ Measures playouts cut off at a few depths and scored by the evaluator: playouts per second from the
+    pinned positions, the score of mcts_vanilla searching with them against full-length playouts at the same
+    per-move budget, alternating colours, and the evaluator's own throughput.
+
+    Returns:        A dict with 'depth_<n>_playouts_per_second' and 'depth_<n>_score' in [-1, 1], and the
+                    positions per second evaluator.state_value and batched evaluator.evaluate score.
+
+    """
+    import evaluator
+
+    def searcher(depth):
+        def think(board, state):
+            root, _ = mcts_vanilla.search(board, state, time_budget_ms=time_budget_ms, depth=depth)
+            return mcts_vanilla.best_action(root, board, state, board.current_player(state))
+        return think
+
+    positions = pinned_positions()
+    opponent = searcher(None)
+    results = {}
+    for depth in depths:
+        policy = mcts_engine.RandomRollout(depth=depth)
+        random.seed(seed)
+        playouts = 0
+        start = time()
+        while time() - start < seconds:
+            policy(board, positions[playouts % len(positions)], 1)
+            playouts += 1
+        results['depth_%d_playouts_per_second' % depth] = playouts / (time() - start)
+
+        bot = searcher(depth)
+        score = 0
+        for game in range(games):
+            if game % 2 == 0:
+                score += play_game(bot, opponent)[1]
+            else:
+                score += play_game(opponent, bot)[2]
+        results['depth_%d_score' % depth] = score / games
+
+    running = [state for state in positions if not board.is_ended(state)]
+    states = [running[i % len(running)] for i in range(batch)]
+    results['state_value_per_second'] = best_rate(lambda: [evaluator.state_value(state, 1) for state in states],
+                                                  batch, seconds)
+    results['evaluate_per_second'] = best_rate(lambda: evaluator.evaluate(states, 1), batch, seconds)
+    return results
+
+
+def pondering(max_nodes=1000, opponent_seconds=0.3, ponder_mb=16, seed=0):
+    """ Plays a node-budgeted bot with and without pondering against an opponent that waits opponent_seconds
+    before each random move, as a human would.
+
+    Returns:        A dict with the mean seconds per move of each bot and, for the pondering one, the visits already
+                    below its root when its turn came as a share of the node budget.
+
+    """
+    import p2_bots
+
+    def opponent(board, state):
+        sleep(opponent_seconds)
+        return random.choice(board.legal_actions(state))
+
+    results = {}
+    for name, spec in (('reuse', 'mcts:reuse=1,nodes=%d' % max_nodes),
+                       ('ponder', 'mcts:ponder=%d,nodes=%d' % (ponder_mb, max_nodes))):
+        bot = p2_bots.make_player(spec)
+        ponderer = p2_bots.ponderers.get(bot)
+        seconds = []
+        carried = []
+
+        def timed(board, state):
+            start = time()
+            action = bot(board, state)
+            seconds.append(time() - start)
+            if ponderer is not None:
+                carried.append(ponderer.last_search['carried_visits'])
+            return action
+
+        random.seed(seed)
+        play_game(timed, opponent)
+        if ponderer is not None:
+            ponderer.stop()
+            results['carried_share'] = sum(carried) / (max_nodes * len(carried))
+        results[name + '_seconds_per_move'] = sum(seconds) / len(seconds)
+    return results
+
+
+def root_parallel_strength(worker_counts=(1, 2, 4), games=4, time_budget_ms=50, seed=0):
+    """ Plays root-parallel MCTS with several worker counts against single-process MCTS at the same
+    per-move wall-clock budget, alternating colours.
+
+    Args:
+        worker_counts:  The pool sizes to try.
+        games:          Games per pool size.
+        time_budget_ms: Per-move budget for both sides.
+        seed:           Seed for both sides.
+
+    Returns:        A dict mapping 'workers_<n>' to the parallel bot's average score in [-1, 1].
+
+    """
+    def single(board, state):
+        root, _ = mcts_vanilla.search(board, state, time_budget_ms=time_budget_ms)
+        return mcts_vanilla.best_action(root, board, state, board.current_player(state))
+
+    results = {}
+    for workers in worker_counts:
+        random.seed(seed)
+        bot = mcts_parallel.RootParallelBot(workers=workers, time_budget_ms=time_budget_ms, seed=seed)
+        score = 0
+        for game in range(games):
+            if game % 2 == 0:
+                score += play_game(bot, single)[1]
+            else:
+                score += play_game(single, bot)[2]
+        bot.close()
+        results['workers_%d' % workers] = score / games
+    return results
+
+
+def tree_parallel_strength(worker_counts=(1, 2, 4), games=4, time_budget_ms=50, virtual_loss=1,
+                           leaf_playouts=1, seed=0):
+    """ Plays shared-tree parallel MCTS with several worker counts against single-process mcts_vanilla search at
+    the same per-move wall-clock budget, alternating colours.
+
+    Returns:        A dict with 'workers_<n>_score' in [-1, 1] and 'workers_<n>_iterations_per_second', the
+                    parallel bot's average over its moves.
+
+    """
+    def single(board, state):
+        root, _ = mcts_vanilla.search(board, state, time_budget_ms=time_budget_ms)
+        return mcts_vanilla.best_action(root, board, state, board.current_player(state))
+
+    results = {}
+    for workers in worker_counts:
+        random.seed(seed)
+        bot = mcts_parallel.TreeParallelBot(workers=workers, virtual_loss=virtual_loss, leaf_playouts=leaf_playouts,
+                                            time_budget_ms=time_budget_ms, seed=seed)
+        rates = []
+
+        def parallel(board, state):
+            action = bot.think(board, state)
+            rates.append(bot.last_search['iterations_per_second'])
+            return action
+
+        score = 0
+        for game in range(games):
+            if game % 2 == 0:
+                score += play_game(parallel, single)[1]
+            else:
+                score += play_game(single, parallel)[2]
+        bot.close()
+        results['workers_%d_score' % workers] = score / games
+        results['workers_%d_iterations_per_second' % workers] = sum(rates) / len(rates)
+    return results
+
+
+def rave_strength(max_nodes=200, uct_factors=(1, 2, 4), games=8, c=0.5, k=50, seed=0):
+    """ Plays RAVE selection with max_nodes per move against plain UCT with that many nodes times each factor,
+    alternating colours, to find the budget at which UCT catches up with RAVE.
+
+    Returns:        A dict with 'uct_x<factor>_score' in [-1, 1] for RAVE, and each bot's 'iterations_per_second'.
+
+    """
+    results = {}
+    for factor in uct_factors:
+        random.seed(seed)
+        rave = mcts_engine.build(select='rave', c=c, k=k, nodes=max_nodes)
+        uct = mcts_engine.build(nodes=max_nodes * factor)
+        score = 0
+        for game in range(games):
+            if game % 2 == 0:
+                score += play_game(rave.think, uct.think)[1]
+            else:
+                score += play_game(uct.think, rave.think)[2]
+        results['uct_x%d_score' % factor] = score / games
+
+    for name, select in (('rave', 'rave'), ('uct', 'uct')):
+        engine = mcts_engine.build(select=select)
+        random.seed(seed)
+        start = time()
+        engine.search(board, state0, max_nodes=max_nodes)
+        results['%s_iterations_per_second' % name] = max_nodes / (time() - start)
+    return results
+
+
+def selfplay_records(games=4, bot='mcts:nodes=200', workers=None, seed=0):
+    """ Generates self-play games into a temporary game file, then maps it back and sums a field.
+
+    Returns:        A dict with the records written per second, the bytes per record and the records read per
+                    second through selfplay.read_records().
+
+    """
+    import os
+    import tempfile
+    import selfplay
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'games.bin')
+    try:
+        start = time()
+        written = selfplay.generate(path, bot, games, workers, seed)
+        results = {'records_per_second': written / (time() - start),
+                   'bytes_per_record': selfplay.record_dtype.itemsize}
+        start = time()
+        records = selfplay.read_records(path)
+        int(records['visits'].sum())
+        results['read_records_per_second'] = len(records) / (time() - start)
+        del records
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(directory)
+    return results
+
+
+def server_latency(clients=8, moves=10, bot='mcts:ms=20', workers=None, seed=0):
+    """ Starts p2_server on a free localhost port and has several clients play random moves against bot at once.
+
+    Returns:        A dict with the 'move' request latency percentiles in milliseconds, the moves answered per
+                    second and the requests turned away as busy.
+
+    """
+    import asyncio
+    import p2_server
+
+    rng = random.Random(seed)
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        reply = await p2_server.request(reader, writer, {'op': 'new', 'bot': bot})
+        session = reply['session']
+        answered = 0
+        for _ in range(moves):
+            state = board.pack_state(reply['state'])
+            if board.is_ended(state):
+                break
+            action = board.unpack_action(rng.choice(board.legal_actions(state)))
+            reply = await p2_server.request(reader, writer, {'op': 'move', 'session': session, 'action': action})
+            if not reply['ok']:
+                break
+            answered += 1
+        writer.close()
+        await writer.wait_closed()
+        return answered
+
+    async def run():
+        server = p2_server.GameServer(workers)
+        listener = await server.start('127.0.0.1', 0)
+        try:
+            start = time()
+            answered = await asyncio.gather(*(client(listener.sockets[0].getsockname()[1])
+                                              for _ in range(clients)))
+            seconds = time() - start
+            stats = server.stats()
+        finally:
+            await server.stop(listener)
+        results = dict(stats['latency']['move'])
+        results['moves_per_second'] = sum(answered) / seconds
+        results['rejected'] = stats['rejected']
+        return results
+
+    return asyncio.run(run())
+
+
+benchmarks = dict(
+    board_ops=board_ops,
+    rollout_speed=rollout_speed,
+    iterations=mcts_iterations,
+    playouts=random_playouts,
+    zobrist=zobrist_playouts,
+    mutable=mutable_playouts,
+    batch_playouts=batch_playouts,
+    node_memory=node_memory,
+    bounded_tree=bounded_tree,
+    selection=large_tree_selection,
+    rollouts=rollout_policies,
+    cutoff=cutoff_rollouts,
+    ponder=pondering,
+    root_parallel=root_parallel_strength,
+    tree_parallel=tree_parallel_strength,
+    rave=rave_strength,
+    server=server_latency,
+    selfplay=selfplay_records,
+)
+
+
+# The benchmarks run when none are named: the throughput and memory ones, which baselines are compared on.
+default_benchmarks = ('board_ops', 'rollout_speed', 'iterations', 'playouts', 'node_memory', 'selection')
+
+
+def is_timing(key):
+    """ Whether a result is a throughput or memory figure that compare() checks, rather than a score or count. """
+    return key.endswith('_per_second') or key == 'bytes_per_node'
+
+
+def compare(results, baseline, threshold=0.1):
+    """ Compares results against a baseline of the same form.
+
+    Args:
+        results:    Dict of 'benchmark.key' -> value from this run.
+        baseline:   Dict of the same form, e.g. loaded from a file written with --save.
+        threshold:  Relative change counted as a regression: throughput down or memory per node up by more.
+
+    Returns:        A list of (name, baseline value, value, relative change) for each regression.
+
+    """
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old or not is_timing(name):
+            continue
+        change = (value - old) / old
+        worse = change > threshold if name.endswith('bytes_per_node') else change < -threshold
+        if worse:
+            regressions.append((name, old, value, change))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the benchmarks and optionally compare with a baseline.")
+    parser.add_argument('names', nargs='*', help="benchmarks to run (default: %s); all: %s"
+                                                 % (','.join(default_benchmarks), ','.join(benchmarks)))
+    parser.add_argument('--save', metavar='PATH', help="write the results to a JSON baseline file")
+    parser.add_argument('--compare', metavar='PATH', help="compare with a JSON baseline and fail on regressions")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative slowdown (or memory growth) counted as a regression")
+    args = parser.parse_args()
+
+    names = args.names or default_benchmarks
+    for name in names:
+        if name not in benchmarks:
+            print(name + " not in " + ','.join(benchmarks.keys()))
+            exit(1)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {}
+    for name in names:
+        for key, value in benchmarks[name]().items():
+            full_name = name + '.' + key
+            results[full_name] = value
+            line = "%s: %.3f" % (full_name, value)
+            if baseline and baseline.get(full_name) and is_timing(full_name):
+                line += " (baseline %.3f, %+.1f%%)" % (baseline[full_name],
+                                                       100 * (value / baseline[full_name] - 1))
+            print(line)
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=1, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for full_name, old, value, change in regressions:
+            print("REGRESSION %s: %.3f -> %.3f (%+.1f%%)" % (full_name, old, value, 100 * change))
+        if regressions:
+            exit(1)
+        print("No regressions beyond %.0f%%" % (100 * args.threshold))
@@ -0,0 +1,129 @@
+import random_bot
+import rollout_bot
+import mcts_vanilla
+import mcts_modified
+import mcts_bot
+import mcts_engine
+import mcts_parallel
+from transposition import TranspositionTable
+from opening_book import OpeningBook, BookPlayer
+
+profiles = {}   # think function -> the profiling.SearchProfile of bots built with profile=1.
+ponderers = {}  # think function -> the mcts_bot.PonderingBot of bots built with ponder=MB.
+
+
+def parse_value(text):
+    """ Turns an option value from a spec string into an int or float when it looks like one. """
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_spec(spec):
+    """ Splits a bot spec 'name' or 'name:key=value,key=value' into the name and a dict of options. """
+    name, _, rest = spec.partition(':')
+    options = {}
+    for item in rest.split(','):
+        if not item:
+            continue
+        key, equals, value = item.partition('=')
+        if not equals:
+            raise ValueError("option %r in %r is not key=value" % (item, spec))
+        options[key.strip()] = parse_value(value.strip())
+    return name.strip(), options
+
+
+def make_mcts(reuse=0, workers=0, table=0, book=None, tree_workers=0, virtual_loss=1, leaf_playouts=1, threads=0,
+              ponder=0, **options):
+    """ Builds a player from mcts_engine policies.
+
+    Args:
+        reuse:      Non-zero to keep the tree between moves (MCTSBot).
+        workers:    Non-zero to run that many root-parallel searches per move (RootParallelBot).
+        table:      Non-zero to share nodes between transpositions, holding at most that many states.
+        book:       Path of an opening book file (see opening_book.py) to play from before searching.
+        tree_workers:   Non-zero to grow one shared tree with that many parallel rollouts (TreeParallelBot),
+                        charging virtual_loss lost playouts to pending paths and running leaf_playouts
+                        rollouts per leaf, in threads instead of processes if threads is non-zero. It cannot be
+                        combined with select=rave, solve, table, tree_nodes, tree_mb, profile or cache_mb.
+        ponder:     Non-zero to keep the tree and grow it in a background thread during the opponent's turn,
+                    using at most that many megabytes per turn (PonderingBot); see ponderers.
+        options:    Policy names and options for mcts_engine.build(): select, rollout, final, c, k, depth,
+                    playouts, nodes, ms, cache_mb, cache_games, cache_prime, solve, profile, tree_nodes and
+                    tree_mb. A profiled bot's SearchProfile is kept in profiles; with workers the searches run in
+                    the pool, so nothing is recorded.
+
+    Returns:    The player's think function.
+
+    """
+    engine = mcts_engine.build(**options)
+    if table:
+        # The same conflicts MCTS.search checks, reported here before any game starts.
+        if getattr(engine.selector, 'amaf', False):
+            raise ValueError("select=%s reads moves from the tree's edges, which a table makes ambiguous: no table"
+                             % options.get('select'))
+        if engine.pool is not None:
+            raise ValueError("tree_nodes and tree_mb prune nodes that a table would share: no table")
+        engine.table = TranspositionTable(table)
+    ponderer = None
+    if tree_workers:
+        # The shared tree is grown with the engine's selector, rollout and final choice only.
+        unsupported = [option for option, used in (
+            ('select=%s' % options.get('select'), getattr(engine.selector, 'amaf', False)),
+            ('solve', engine.solver is not None),
+            ('table', table),
+            ('tree_nodes/tree_mb', engine.pool is not None),
+            ('profile', engine.profile is not None),
+            ('cache_mb', isinstance(engine.rollout, mcts_engine.CachedRollout)),
+        ) if used]
+        if unsupported:
+            raise ValueError("tree_workers does not support " + ', '.join(unsupported))
+        think = mcts_parallel.TreeParallelBot(engine, tree_workers, virtual_loss, leaf_playouts, engine.max_nodes,
+                                              engine.time_budget_ms, bool(threads)).think
+    elif workers:
+        think = mcts_parallel.RootParallelBot(engine, workers, engine.max_nodes, engine.time_budget_ms).think
+    elif ponder:
+        ponderer = mcts_bot.PonderingBot(engine, engine.max_nodes, engine.time_budget_ms, engine.table, ponder)
+        think = ponderer.think
+    elif reuse:
+        think = mcts_bot.MCTSBot(engine, engine.max_nodes, engine.time_budget_ms, engine.table).think
+    else:
+        think = engine.think
+    if book:
+        try:
+            think = BookPlayer(OpeningBook(book), think).think
+        except OSError as error:
+            raise ValueError("cannot open book %s: %s" % (book, error))
+    if engine.profile is not None:
+        profiles[think] = engine.profile
+    if ponderer is not None:
+        ponderers[think] = ponderer
+    return think
+
+
+# Bot name -> factory taking the spec's options and returning a think function.
+bots = dict(
+    random_bot=lambda: random_bot.think,
+    rollout_bot=lambda: rollout_bot.think,
+    mcts_vanilla=lambda: mcts_vanilla.think,
+    mcts_modified=lambda: mcts_modified.think,
+    mcts_reuse=lambda: mcts_bot.MCTSBot().think,
+    mcts=make_mcts,
+)
+
+
+def make_player(spec):
+    """ Builds a player from a spec string such as 'mcts_vanilla' or 'mcts:select=puct,rollout=heuristic,ms=100'.
+
+    Raises ValueError for an unknown bot, policy or option.
+    """
+    name, options = parse_spec(spec)
+    if name not in bots:
+        raise ValueError(name + " not in " + ','.join(bots.keys()))
+    try:
+        return bots[name](**options)
+    except TypeError as error:
+        raise ValueError("bad options for %s: %s" % (name, error))
@@ -1,9 +1,6 @@
 import sys
 import p2_t3
-import mcts_vanilla
-import mcts_modified
-import random_bot
-import rollout_bot
+from p2_bots import bots, make_player, ponderers
 
 def get_human_input(board, state):
     move = input("Which move? BoardY BoardX SquareY SquareX (or q to quit) ").strip()
@@ -16,13 +13,18 @@ def get_human_input(board, state):
         print("Please input moves as space-separated lists of numbers.  Remember that you can only move in the board corresponding to your opponent's last move!")
         return get_human_input(board, state)
 
-players = dict(
-    human=get_human_input,
-    random_bot=random_bot.think,
-    rollout_bot=rollout_bot.think,
-    mcts_vanilla=mcts_vanilla.think,
-    mcts_modified=mcts_modified.think
-)
+
+def get_player(spec):
+    """ Returns the human player for 'human', otherwise builds a bot from its spec (see p2_bots.make_player). """
+    if spec == "human":
+        return get_human_input
+    try:
+        return make_player(spec)
+    except ValueError as error:
+        print(error)
+        print("players: human," + ','.join(bots.keys()))
+        exit(1)
+
 
 board = p2_t3.Board()
 state0 = board.starting_state()
@@ -31,25 +33,27 @@ if len(sys.argv) != 3:
     print("Need two player arguments")
     exit(1)
 
-p1 = sys.argv[1]
-if p1 not in players:
-    print("p1 not in " + ','.join(players.keys()))
-    exit(1)
-p2 = sys.argv[2]
-if p2 not in players:
-    print("p2 not in " + ','.join(players.keys()))
-    exit(1)
-
-player1 = players[p1]
-player2 = players[p2]
+player1 = get_player(sys.argv[1])
+player2 = get_player(sys.argv[2])
 state = state0
 last_action = None
 current_player = player1
-while not board.is_ended(state):
-    print(board.display(state, last_action))
-    print("Player "+str(board.current_player(state)))
-    last_action = current_player(board, state)
-    state = board.next_state(state, last_action)
-    current_player = player1 if current_player == player2 else player2
+try:
+    while not board.is_ended(state):
+        print(board.display(state, last_action))
+        print("Player "+str(board.current_player(state)))
+        last_action = current_player(board, state)
+        state = board.next_state(state, last_action)
+        # A move answered by the opening book leaves no search statistics.
+        stats = ponderers[current_player].last_search if current_player in ponderers else {}
+        if 'ponder_iterations' in stats:
+            print("Pondered %d iterations, %d visits carried into this move, %d searched" % (
+                stats['ponder_iterations'], stats['carried_visits'], stats['iterations']))
+        current_player = player1 if current_player == player2 else player2
+finally:
+    # Pondering bots search in the background during the other side's turn; stop them before leaving.
+    for player in (player1, player2):
+        if player in ponderers:
+            ponderers[player].stop()
 print("Finished!")
 print(board.points_values(state))
@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import p2_t3
+from p2_bots import parse_spec, make_player
+
+board = p2_t3.Board()
+players = {}    # spec -> think function, built once per worker process.
+
+# mcts options that keep searching or keep a tree between moves. A worker's player serves every session with
+# that spec, so these would mix unrelated games, or run on after a reply and eat other sessions' budgets.
+stateful_options = ('reuse', 'ponder', 'table', 'workers', 'tree_workers')
+
+
+def seed_worker():
+    """ Pool initializer: forked workers would otherwise share the parent's random sequence. """
+    random.seed(os.getpid() ^ int(time.time() * 1000))
+
+
+def budgeted_spec(spec, time_budget_ms):
+    """ Adds the session's per-move budget to an mcts spec that sets neither nodes nor ms. Other bots keep their
+    own fixed budgets.
+    """
+    name, options = parse_spec(spec)
+    if time_budget_ms is None or name != 'mcts' or 'nodes' in options or 'ms' in options:
+        return spec
+    return spec + (',' if ':' in spec else ':') + 'ms=%d' % time_budget_ms
+
+
+def think(spec, state):
+    """ Runs in a worker process: returns the move of the bot built from spec, and the seconds it took. """
+    if spec not in players:
+        players[spec] = make_player(spec)
+    start = time.perf_counter()
+    action = players[spec](board, state)
+    return action, time.perf_counter() - start
+
+
+class Session:
+    def __init__(self, session_id, spec, bot_player, time_budget_ms):
+        self.id = session_id
+        self.spec = spec                    # Bot spec with the session's budget applied.
+        self.bot_player = bot_player        # 1 or 2.
+        self.time_budget_ms = time_budget_ms
+        self.state = board.starting_state()
+        self.thinking_seconds = 0.          # Total time the bot spent on this session's moves.
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()          # Held while a move is applied, so concurrent requests take turns.
+
+
+class GameServer:
+    def __init__(self, workers=None, max_pending=None, queue_timeout=1., default_ms=100, max_ms=5000,
+                 max_sessions=10000, window=10000):
+        """ Hosts games between clients and bots over newline-delimited JSON, one request and one reply per line.
+
+        Requests are objects with an 'op':
+            new:    {'bot': spec, 'player': 1 or 2 (the client's side, default 1), 'ms': per-move budget}
+                    starts a session; if the bot moves first its move is in the reply.
+            move:   {'session': id, 'action': 'R C r c'} plays the client's move (Board.pack_action format) and
+                    replies with the bot's answer. Without an action it asks for the bot's move when the bot is to
+                    move, e.g. after a 'busy' reply.
+            think:  {'bot': spec, 'state': unpacked state (Board.unpack_state format), 'ms': budget} asks for one
+                    move without a session.
+            close:  {'session': id} ends a session.
+            stats:  latency percentiles per op, pool load and session counts.
+        Replies carry 'ok', the state as Board.unpack_state() gives it, the bot's 'action' as
+        Board.unpack_action() gives it and the 'winner' (1, 2, 0 for a draw) once the game is over, or an
+        'error'. A session's replies to 'busy' still carry its state. Bots are built once per worker and shared by
+        sessions, so specs with stateful_options are refused.
+
+        Bot moves run in a process pool so the event loop never blocks. At most max_pending of them are
+        queued or running; a request that cannot get a slot within queue_timeout seconds is answered with
+        error 'busy' instead of queueing without bound.
+
+        Args:
+            workers:        Pool size, defaulting to the number of CPUs.
+            max_pending:    Bot moves queued or running at once, twice workers if None.
+            queue_timeout:  Seconds a request may wait for a pool slot.
+            default_ms:     Per-move budget of sessions that do not ask for one.
+            max_ms:         Largest per-move budget a client may ask for.
+            max_sessions:   Sessions kept; the least recently used one is dropped beyond this.
+            window:         Latencies kept per op for the percentiles.
+
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.queue_timeout = queue_timeout
+        self.default_ms = default_ms
+        self.max_ms = max_ms
+        self.max_sessions = max_sessions
+        self.window = window
+
+        self.pool = None
+        self.slots = None
+        self.valid_specs = set()
+        self.sessions = {}
+        self.connections = set()    # Tasks serving open connections.
+        self.session_ids = itertools.count(1)
+        self.latencies = {}     # op -> deque of recent request latencies in milliseconds
+        self.rejected = 0       # Requests answered 'busy'.
+        self.pending = 0        # Bot moves queued or running.
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """ Starts the pool and listens; returns the asyncio server (port 0 picks a free port). """
+        # Workers forked straight from this process would inherit the sockets open at the time, so a client
+        # closing its end would never be seen; forkserver forks them from a clean process started here.
+        context = None
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+        self.pool = ProcessPoolExecutor(self.workers, context, initializer=seed_worker)
+        self.slots = asyncio.Semaphore(self.max_pending)
+        return await asyncio.start_server(self.serve_client, host, port)
+
+    async def stop(self, listener, timeout=1.):
+        """ Stops listening, gives open connections timeout seconds to finish, then shuts the pool down. """
+        listener.close()
+        if self.connections:
+            _, unfinished = await asyncio.wait(self.connections, timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def serve_client(self, reader, writer):
+        """ Answers one connection's requests in order until it closes. """
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                op = 'invalid'
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request must be a JSON object")
+                    op = request.get('op')
+                    reply = await self.handle(op, request)
+                except (ValueError, KeyError, TypeError) as error:
+                    op, reply = 'invalid', {'ok': False, 'error': str(error)}
+                except Exception as error:     # A broken pool or a failing bot must not end the connection.
+                    reply = {'ok': False, 'error': 'internal error: %r' % (error,)}
+                self.record(op, time.perf_counter() - start)
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()    # Stop reading from a client that does not read its replies.
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    def record(self, op, seconds):
+        if op not in self.latencies:
+            self.latencies[op] = deque(maxlen=self.window)
+        self.latencies[op].append(1000 * seconds)
+
+    async def handle(self, op, request):
+        if op == 'new':
+            return await self.new_session(request)
+        if op == 'move':
+            return await self.play_move(request)
+        if op == 'think':
+            state = board.pack_state(request['state'])
+            spec = self.check_spec(budgeted_spec(request['bot'], self.budget(request)))
+            action = await self.bot_move(spec, state)
+            if action is None:
+                return {'ok': False, 'error': 'busy'}
+            return {'ok': True, 'action': board.unpack_action(action)}
+        if op == 'close':
+            self.sessions.pop(request['session'], None)
+            return {'ok': True}
+        if op == 'stats':
+            return dict(self.stats(), ok=True)
+        raise ValueError("unknown op %r" % (op,))
+
+    def check_spec(self, spec):
+        """ Builds the bot once here so bad specs, and specs with stateful_options, raise ValueError before
+        reaching a worker.
+        """
+        if spec not in self.valid_specs:
+            _, options = parse_spec(spec)
+            stateful = [option for option in stateful_options if options.get(option)]
+            if stateful:
+                raise ValueError("the server shares bots between sessions: %s not allowed" % ', '.join(stateful))
+            make_player(spec)
+            self.valid_specs.add(spec)
+        return spec
+
+    def budget(self, request):
+        ms = request.get('ms', self.default_ms)
+        if not isinstance(ms, (int, float)) or not 0 < ms <= self.max_ms:
+            raise ValueError("ms must be in (0, %d]" % self.max_ms)
+        return int(ms)
+
+    async def new_session(self, request):
+        client_player = request.get('player', 1)
+        if client_player not in (1, 2):
+            raise ValueError("player must be 1 or 2")
+        time_budget_ms = self.budget(request)
+        spec = self.check_spec(budgeted_spec(request['bot'], time_budget_ms))
+
+        if len(self.sessions) >= self.max_sessions:
+            oldest = min(self.sessions.values(), key=lambda session: session.last_used)
+            del self.sessions[oldest.id]
+        session = Session(next(self.session_ids), spec, 3 - client_player, time_budget_ms)
+        self.sessions[session.id] = session
+        reply = {'ok': True, 'session': session.id}
+        if session.bot_player == 1:
+            async with session.lock:
+                return await self.answer(session, reply)
+        reply['state'] = board.unpack_state(session.state)
+        return reply
+
+    async def play_move(self, request):
+        session = self.sessions.get(request['session'])
+        if session is None:
+            return {'ok': False, 'error': 'no such session'}
+        session.last_used = time.monotonic()
+        async with session.lock:
+            if board.is_ended(session.state):
+                return {'ok': False, 'error': 'game over'}
+            reply = {'ok': True, 'session': session.id}
+            notation = request.get('action')
+            if board.current_player(session.state) == session.bot_player:
+                if notation is not None:
+                    return {'ok': False, 'error': 'not your turn', 'state': board.unpack_state(session.state)}
+                # The bot's move is still owed, e.g. after a 'busy' reply.
+                return await self.answer(session, reply)
+            if notation is None:
+                return {'ok': False, 'error': 'your move needs an action', 'state': board.unpack_state(session.state)}
+            action = board.pack_action(notation)
+            if action is None or not board.is_legal(session.state, action):
+                return {'ok': False, 'error': 'illegal move', 'state': board.unpack_state(session.state)}
+            session.state = board.next_state(session.state, action)
+            return await self.answer(session, reply)
+
+    async def answer(self, session, reply):
+        """ Lets the session's bot reply to the current state unless the game is over, and fills in reply. """
+        if not board.is_ended(session.state):
+            action = await self.bot_move(session.spec, session.state, session)
+            if action is None:
+                # The client's move stands; a move request without an action gets the bot's move later.
+                reply.update(ok=False, error='busy', state=board.unpack_state(session.state))
+                return reply
+            session.state = board.next_state(session.state, action)
+            reply['action'] = board.unpack_action(action)
+        reply['state'] = board.unpack_state(session.state)
+        values = board.win_values(session.state)
+        if values is not None:
+            reply['winner'] = 0 if values[1] == 0.5 else (1 if values[1] else 2)
+        return reply
+
+    async def bot_move(self, spec, state, session=None):
+        """ Runs the bot in the pool once a slot is free. Returns None if none frees up within queue_timeout. """
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return None
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            action, seconds = await loop.run_in_executor(self.pool, think, spec, state)
+        finally:
+            self.pending -= 1
+            self.slots.release()
+        if session is not None:
+            session.thinking_seconds += seconds
+        return action
+
+    def stats(self):
+        latency = {}
+        for op, samples in self.latencies.items():
+            ordered = sorted(samples)
+            latency[op] = dict(count=len(ordered), **dict(
+                ('p%d_ms' % q, ordered[min(len(ordered) - 1, len(ordered) * q // 100)]) for q in (50, 90, 99)))
+        return {
+            'latency': latency,
+            'sessions': len(self.sessions),
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'workers': self.workers,
+            'rejected': self.rejected,
+        }
+
+
+async def request(reader, writer, message):
+    """ Client helper: sends one request on an open connection and returns the decoded reply. """
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def serve(host, port, workers, max_pending, default_ms):
+    server = GameServer(workers, max_pending, default_ms=default_ms)
+    listener = await server.start(host, port)
+    print("Serving on %s:%d with %d workers" % (host, listener.sockets[0].getsockname()[1], server.workers))
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.stop(listener)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve bot games over newline-delimited JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--max-pending', type=int, default=None, help="bot moves queued or running at once")
+    parser.add_argument('--ms', type=int, default=100, help="default per-move budget of mcts sessions")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending, args.ms))
+    except KeyboardInterrupt:
+        pass
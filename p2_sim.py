@@ -1,66 +1,62 @@
-import sys
+import argparse
 from timeit import default_timer as time
-import p2_t3
-import mcts_vanilla
-import mcts_modified
-import random_bot
-import rollout_bot
-
-players = dict(
-    random_bot=random_bot.think,
-    rollout_bot=rollout_bot.think,
-    mcts_vanilla=mcts_vanilla.think,
-    mcts_modified=mcts_modified.think
-)
-
-board = p2_t3.Board()
-state0 = board.starting_state()
-
-if len(sys.argv) != 3:
-    print("Need two player arguments")
-    exit(1)
-
-p1 = sys.argv[1]
-if p1 not in players:
-    print("p1 not in " + ','.join(players.keys()))
-    exit(1)
-p2 = sys.argv[2]
-if p2 not in players:
-    print("p2 not in " + ','.join(players.keys()))
-    exit(1)
-
-player1 = players[p1]
-player2 = players[p2]
-
-rounds = 100
-wins = {'draw':0, 1:0, 2:0}
+from p2_bots import bots, make_player
+from p2_tournament import run_tournament
+
+parser = argparse.ArgumentParser(description="Play two bots against each other over a process pool.")
+parser.add_argument('p1', help="bot A spec, e.g. mcts:select=puct,rollout=heuristic,ms=100; bots: "
+                               + ','.join(bots.keys()))
+parser.add_argument('p2', help="bot B spec")
+parser.add_argument('--rounds', type=int, default=100, help="number of games, colours alternate")
+parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+parser.add_argument('--seed', type=int, default=0, help="base seed, game i uses seed + i")
+parser.add_argument('--out', default=None, help="JSONL file to append each game's result to")
+parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'), default=None,
+                    help="stop early once an SPRT of ELO0 against ELO1 (alpha = beta = 0.05) decides")
+parser.add_argument('--profile', default=None, metavar='PATH',
+                    help="write per-move search records of bots with profile=1 to PATH (.json or .csv)")
+args = parser.parse_args()
+
+for p in (args.p1, args.p2):
+    try:
+        make_player(p)
+    except ValueError as error:
+        print(error)
+        exit(1)
+
+
+def report(result, summary):
+    print("Round %d: %s vs %s, %s scores %s" % (result['game'], result['player1'], result['player2'],
+                                                args.p1, result['score']))
+
+
+sprt = None
+if args.sprt:
+    sprt = (args.sprt[0], args.sprt[1], 0.05, 0.05)
 
 start = time()  # To log how much time the simulation takes.
-for i in range(rounds):
-
-    print("")
-    print("Round %d, fight!" % i)
-
-    state = state0
-    last_action = None
-    current_player = player1
-    while not board.is_ended(state):
-        last_action = current_player(board, state)
-        state = board.next_state(state, last_action)
-        current_player = player1 if current_player == player2 else player2
-    print("Finished!")
-    print()
-    final_score = board.points_values(state)
-    winner = 'draw'
-    if final_score[1] == 1:
-        winner = 1
-    elif final_score[2] == 1:
-        winner = 2
-    print("The %s bot wins this round! (%s)" % (winner, str(final_score)))
-    wins[winner] = wins.get(winner, 0) + 1
+summary = run_tournament(args.p1, args.p2, games=args.rounds, workers=args.workers, out=args.out,
+                         seed=args.seed, sprt=sprt, on_result=report, profile_out=args.profile)
 
 print("")
-print("Final win counts:", dict(wins))
+print("Final counts for %s: %d wins, %d draws, %d losses" % (args.p1, summary['wins'], summary['draws'],
+                                                             summary['losses']))
+for name in ('win', 'draw', 'loss'):
+    low, high = summary[name + '_interval']
+    print("%s rate: %.3f (95%% CI %.3f-%.3f)" % (name, summary[name + '_rate'], low, high))
+low, high = summary['score_interval']
+print("score: %.3f (95%% CI %.3f-%.3f)" % (summary['score'], low, high))
+if sprt:
+    print("SPRT: LLR %.2f, decision %s" % (summary['llr'], summary['decision']))
+for side, spec in (('a', args.p1), ('b', args.p2)):
+    profile = summary.get('profile_' + side)
+    if profile:
+        print("Profile of %s over %d moves: %.0f iterations/s, max depth %d, largest tree %d, "
+              "rollout length %.1f, %d next_state calls" % (spec, profile['moves'], profile['iterations_per_second'],
+                                                           profile['max_depth'], profile['tree_size'],
+                                                           profile['rollout_length'], profile['next_state_calls']))
+        print("  time: " + ', '.join("%s %.1f%%" % (phase, 100 * profile[phase + '_share'])
+                                     for phase in ('select', 'expand', 'rollout', 'backprop')))
 
 # Also output the time elapsed.
 end = time()
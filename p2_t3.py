@@ -18,6 +18,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import random
+
 num_players = 2
 
 positions = dict(
@@ -30,17 +32,166 @@ inv_positions = dict(
     (v, P) for P, v in positions.items()
 )
 
-class Board(object):
-    wins = [
-        positions[(r, 0)] | positions[(r, 1)] | positions[(r, 2)]
-        for r in range(3)
-    ] + [
-        positions[(0, c)] | positions[(1, c)] | positions[(2, c)]
-        for c in range(3)
-    ] + [
-        positions[(0, 0)] | positions[(1, 1)] | positions[(2, 2)],
-        positions[(0, 2)] | positions[(1, 1)] | positions[(2, 0)],
+wins = [
+    positions[(r, 0)] | positions[(r, 1)] | positions[(r, 2)]
+    for r in range(3)
+] + [
+    positions[(0, c)] | positions[(1, c)] | positions[(2, c)]
+    for c in range(3)
+] + [
+    positions[(0, 0)] | positions[(1, 1)] | positions[(2, 2)],
+    positions[(0, 2)] | positions[(1, 1)] | positions[(2, 0)],
+]
+
+# Lookup tables indexed by a 9-bit board mask.  win_table[mask] says whether
+# the mask contains a three-in-a-row, free_cells[mask] lists the (r, c) cells
+# not set in the mask, and board_actions[3 * R + C][mask] is the ready-made
+# list of actions for sub-board (R, C) when mask is its occupied cells.
+win_table = [
+    any(mask & w == w for w in wins) for mask in range(512)
+]
+
+free_cells = [
+    tuple(inv_positions[1 << i] for i in range(9) if not mask & (1 << i))
+    for mask in range(512)
+]
+
+board_actions = [
+    [
+        tuple((R, C, r, c) for r, c in free_cells[mask])
+        for mask in range(512)
     ]
+    for R in range(3)
+    for C in range(3)
+]
+
+# winning_cells[mask] has a bit set for every cell not in mask that would
+# complete a three-in-a-row if added to it.  The same table serves sub-boards
+# (cells) and the macro board (sub-boards).
+winning_cells = [
+    sum(1 << i for i in range(9) if not mask & (1 << i) and win_table[mask | (1 << i)])
+    for mask in range(512)
+]
+
+# Outcome of the macro board keyed by (p1_boards << 9) | p2_boards, filled in
+# lazily: 0 while the game is running, 1 or 2 for a winner, 3 for a draw.
+macro_outcomes = {}
+
+
+def macro_outcome(p1_boards, p2_boards):
+    key = (p1_boards << 9) | p2_boards
+    try:
+        return macro_outcomes[key]
+    except KeyError:
+        pass
+    if win_table[p1_boards & ~p2_boards]:
+        outcome = 1
+    elif win_table[p2_boards & ~p1_boards]:
+        outcome = 2
+    elif p1_boards | p2_boards == 0x1ff:
+        outcome = 3
+    else:
+        outcome = 0
+    macro_outcomes[key] = outcome
+    return outcome
+
+
+# Zobrist keys: one per (sub-board, cell, player), one per constraint with index 9
+# standing for an unconstrained move, and one toggled whenever player 2 is to
+# move.  The macro board follows from the pieces, so it needs no keys.  A fixed
+# seed keeps hashes equal across processes and runs.
+_zobrist_rng = random.Random(0x5eed)
+zobrist_pieces = [
+    [(_zobrist_rng.getrandbits(64), _zobrist_rng.getrandbits(64)) for cell in range(9)]
+    for outer in range(9)
+]
+zobrist_constraints = [_zobrist_rng.getrandbits(64) for i in range(10)]
+zobrist_player2 = _zobrist_rng.getrandbits(64)
+
+
+def zobrist_hash(state):
+    """ Computes the 64-bit Zobrist hash of a state from scratch. """
+    h = zobrist_constraints[9 if state[20] is None else 3 * state[20] + state[21]]
+    if state[-1] == 2:
+        h ^= zobrist_player2
+    for outer in range(9):
+        for player_index in range(2):
+            mask = state[2 * outer + player_index]
+            for cell in range(9):
+                if mask & (1 << cell):
+                    h ^= zobrist_pieces[outer][cell][player_index]
+    return h
+
+
+class HashedState(tuple):
+    """ A state tuple carrying its Zobrist hash in .zobrist, which Board.next_state
+    keeps up to date incrementally.  hash() is taken from the Zobrist hash, so dicts keyed
+    by these states skip hashing all 23 elements; do not mix them with plain tuples
+    as keys of the same dict.
+    """
+
+    def __hash__(self):
+        return self.zobrist
+
+
+def apply_move(buffer, action):
+    """ Plays action on buffer, a list holding a state, in place.  The rules of
+    a move live here only: Board.next_state, Board.apply and MutableState.do
+    all play their moves with it.
+    """
+    R, C, r, c = action
+    player = buffer[-1]
+    outer = 3 * R + C
+    board_index = 2 * outer
+    cell = 3 * r + c
+
+    buffer[-1] = 3 - player
+    updated_board = buffer[board_index + player - 1] | (1 << cell)
+    buffer[board_index + player - 1] = updated_board
+
+    if win_table[updated_board]:
+        buffer[17 + player] |= 1 << outer
+    elif buffer[board_index] | buffer[board_index + 1] == 0x1ff:
+        buffer[18] |= 1 << outer
+        buffer[19] |= 1 << outer
+
+    if (buffer[18] | buffer[19]) & (1 << cell):
+        buffer[20], buffer[21] = None, None
+    else:
+        buffer[20], buffer[21] = r, c
+
+
+class MutableState(list):
+    """ A state as a list that is changed in place: do(action) plays a move and
+    undo() takes back the last one, restoring the entries do() saved on a small
+    stack.  Board's query methods (legal_actions, is_ended, win_values, ...)
+    accept it like a tuple state; freeze() returns the tuple for everything else.
+    """
+
+    __slots__ = ('history',)
+
+    def __init__(self, state):
+        list.__init__(self, state)
+        self.history = []
+
+    def do(self, action):
+        """ Plays action in place, saving what undo() needs to take it back. """
+        index = 6 * action[0] + 2 * action[1] + self[-1] - 1
+        self.history.append((index, self[index], self[18], self[19], self[20], self[21]))
+        apply_move(self, action)
+
+    def undo(self):
+        """ Takes back the last move played with do(). """
+        index, mask, self[18], self[19], self[20], self[21] = self.history.pop()
+        self[index] = mask
+        self[-1] = 3 - self[-1]
+
+    def freeze(self):
+        return tuple(self)
+
+
+class Board(object):
+    wins = wins
 
     def starting_state(self):
         # Each of the 9 pairs of player 1 and player 2 board bitmasks
@@ -183,30 +334,44 @@ class Board(object):
     def display_action(self, action):
         return self.unpack_action(action)
 
+    # Plays action on buffer, a list holding a state, in place.
+    apply = staticmethod(apply_move)
+
     def next_state(self, state, action):
+        if type(state) is not HashedState:
+            state = list(state)
+            apply_move(state, action)
+            return tuple(state)
+
         R, C, r, c = action
-        player = state[-1]
-        board_index = 2 * (3 * R + C)
-        player_index = player - 1
+        cell = 3 * r + c
+        h = state.zobrist
+        h ^= zobrist_pieces[3 * R + C][cell][state[-1] - 1] ^ zobrist_player2
+        h ^= zobrist_constraints[9 if state[20] is None else 3 * state[20] + state[21]]
 
         state = list(state)
-        state[-1] = 3 - player
-        state[board_index + player_index] |= positions[(r, c)]
-        updated_board = state[board_index + player_index]
-
-        full = (state[board_index] | state[board_index + 1] == 0x1ff)
-        if any(updated_board & w == w for w in self.wins):
-            state[18 + player_index] |= positions[(R, C)]
-        elif full:
-            state[18] |= positions[(R, C)]
-            state[19] |= positions[(R, C)]
-
-        if (state[18] | state[19]) & positions[(r, c)]:
-            state[20], state[21] = None, None
-        else:
-            state[20], state[21] = r, c
-
-        return tuple(state)
+        apply_move(state, action)
+        state = HashedState(state)
+        state.zobrist = h ^ zobrist_constraints[9 if state[20] is None else cell]
+        return state
+
+    def hashed(self, state):
+        """ Returns state as a HashedState, so that next_state maintains its Zobrist hash from then on. """
+        if type(state) is HashedState:
+            return state
+        state = HashedState(state)
+        state.zobrist = zobrist_hash(state)
+        return state
+
+    def mutable(self, state):
+        """ Returns a MutableState copy of state for playing moves in place with do() and undo(). """
+        return MutableState(state)
+
+    def zobrist(self, state):
+        """ Returns the Zobrist hash of state; O(1) for a HashedState, computed from scratch otherwise. """
+        if type(state) is HashedState:
+            return state.zobrist
+        return zobrist_hash(state)
 
     def is_legal(self, state, action):
         R, C, r, c = action
@@ -239,26 +404,16 @@ class Board(object):
         return (R, C) == (state[20], state[21])
 
     def legal_actions(self, state):
-        R, C = state[20], state[21]
-        Rset, Cset = (R,), (C,)
-        if R is None:
-            Rset, Cset = range(3), range(3)
-
-        occupied = [
-            state[2 * x] | state[2 * x + 1] for x in range(9)
-        ]
-        finished = state[18] | state[19]
-
-        actions = [
-            (R, C, r, c)
-            for R in Rset
-            for C in Cset
-            for r in range(3)
-            for c in range(3)
-            if not occupied[3 * R + C] & positions[(r, c)]
-            and not finished & positions[(R, C)]
-        ]
+        R = state[20]
+        if R is not None:
+            outer = 3 * R + state[21]
+            return list(board_actions[outer][state[2 * outer] | state[2 * outer + 1]])
 
+        finished = state[18] | state[19]
+        actions = []
+        for outer in range(9):
+            if not finished & (1 << outer):
+                actions.extend(board_actions[outer][state[2 * outer] | state[2 * outer + 1]])
         return actions
 
     def previous_player(self, state):
@@ -268,29 +423,15 @@ class Board(object):
         return state[-1]
 
     def is_ended(self, state):
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
-
-        if any(w & p1 == w for w in self.wins):
-            return True
-        if any(w & p2 == w for w in self.wins):
-            return True
-        if state[18] | state[19] == 0x1ff:
-            return True
-
-        return False
+        return macro_outcome(state[18], state[19]) != 0
 
     def win_values(self, state):
-        if not self.is_ended(state):
-            return
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
-
-        if any(w & p1 == w for w in self.wins):
+        outcome = macro_outcome(state[18], state[19])
+        if outcome == 1:
             return {1: 1, 2: 0}
-        if any(w & p2 == w for w in self.wins):
+        if outcome == 2:
             return {1: 0, 2: 1}
-        if state[18] | state[19] == 0x1ff:
+        if outcome == 3:
             return {1: 0.5, 2: 0.5}
 
     def owned_boxes(self, state):
@@ -308,16 +449,12 @@ class Board(object):
         return ret
         
     def points_values(self, state):
-        if not self.is_ended(state):
-            return
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
-
-        if any(w & p1 == w for w in self.wins):
+        outcome = macro_outcome(state[18], state[19])
+        if outcome == 1:
             return {1: 1, 2: -1}
-        if any(w & p2 == w for w in self.wins):
+        if outcome == 2:
             return {1: -1, 2: 1}
-        if state[18] | state[19] == 0x1ff:
+        if outcome == 3:
             return {1: 0, 2: 0}
 
     def winner_message(self, winners):
@@ -0,0 +1,218 @@
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from math import log, sqrt
+
+import p2_t3
+import profiling
+from p2_bots import make_player, ponderers, profiles
+
+board = p2_t3.Board()
+players = {}    # (spec, 'a' or 'b') -> think function, built once per worker process.
+
+
+def get_player(spec, side):
+    """ Returns this process's player for spec on the given side, building it on first use. """
+    key = (spec, side)
+    if key not in players:
+        players[key] = make_player(spec)
+    return players[key]
+
+
+def play_game(game, bot_a, bot_b, seed):
+    """ Plays one game in a worker process. Bot A moves first in even-numbered games and second in odd ones.
+
+    Args:
+        game:   The game number.
+        bot_a:  Spec of bot A, see p2_bots.make_player().
+        bot_b:  Spec of bot B.
+        seed:   Seed for the random number generator shared by both bots.
+
+    Returns:    A dict describing the game, with 'score' being bot A's result: 1 win, 0.5 draw, 0 loss.
+
+    """
+    random.seed(seed)
+    player_a, player_b = get_player(bot_a, 'a'), get_player(bot_b, 'b')
+    first, second = (bot_a, bot_b) if game % 2 == 0 else (bot_b, bot_a)
+    current_player, other_player = (player_a, player_b) if game % 2 == 0 else (player_b, player_a)
+
+    state = board.starting_state()
+    moves = 0
+    try:
+        while not board.is_ended(state):
+            state = board.next_state(state, current_player(board, state))
+            current_player, other_player = other_player, current_player
+            moves += 1
+    finally:
+        # A pondering bot would otherwise keep searching while the worker plays its next game.
+        for player in (player_a, player_b):
+            if player in ponderers:
+                ponderers[player].stop()
+
+    values = board.win_values(state)
+    result = {
+        'game': game,
+        'seed': seed,
+        'player1': first,
+        'player2': second,
+        'moves': moves,
+        'win_values': values,
+        'score': values[1] if game % 2 == 0 else values[2],
+    }
+    # Per-move search records of profiled bots (spec option profile=1).
+    for key, player in (('profile_a', player_a), ('profile_b', player_b)):
+        profile = profiles.get(player)
+        if profile is not None:
+            result[key] = profile.drain()
+    return result
+
+
+def wilson_interval(successes, trials, z=1.96):
+    """ Returns the Wilson score interval for a binomial proportion. """
+    if trials == 0:
+        return 0., 1.
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = z * sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0., centre - margin), min(1., centre + margin)
+
+
+def summarize(wins, draws, losses, z=1.96):
+    """ Win/draw/loss rates for bot A with confidence intervals.
+
+    Args:
+        wins:   Games bot A won.
+        draws:  Drawn games.
+        losses: Games bot A lost.
+        z:      Normal quantile of the intervals; 1.96 gives 95%.
+
+    Returns:    A dict with the counts, each rate and its interval, and the mean score and its interval.
+
+    """
+    games = wins + draws + losses
+    summary = {'games': games, 'wins': wins, 'draws': draws, 'losses': losses}
+    for name, count in (('win', wins), ('draw', draws), ('loss', losses)):
+        summary[name + '_rate'] = count / games if games else 0.
+        summary[name + '_interval'] = wilson_interval(count, games, z)
+
+    score = (wins + draws / 2) / games if games else 0.
+    margin = 0.
+    if games:
+        # The variance takes half a game more of each outcome, as in sprt_llr, so the interval keeps some width
+        # when every game so far ended the same way.
+        padded = games + 1.5
+        padded_score = (wins + 0.5 + (draws + 0.5) / 2) / padded
+        variance = (wins + 0.5 + (draws + 0.5) / 4) / padded - padded_score * padded_score
+        margin = z * sqrt(variance / games)
+    summary['score'] = score
+    summary['score_interval'] = (max(0., score - margin), min(1., score + margin))
+    return summary
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """ Log-likelihood ratio of H1 (bot A is elo1 stronger) against H0 (elo0 stronger), using the
+    normal approximation of the trinomial score distribution. Half a game is added to each outcome so the
+    variance stays positive when every game so far ended the same way.
+    """
+    if wins + draws + losses == 0:
+        return 0.
+    wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = ((wins + draws / 4) / games - score * score) / games
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_decision(llr, alpha=0.05, beta=0.05):
+    """ Returns 'H1' or 'H0' once the LLR crosses a bound, or None while undecided. """
+    if llr >= log((1 - beta) / alpha):
+        return 'H1'
+    if llr <= log(beta / (1 - alpha)):
+        return 'H0'
+    return None
+
+
+def run_tournament(bot_a, bot_b, games=100, workers=None, out=None, seed=0, sprt=None, on_result=None,
+                   profile_out=None):
+    """ Plays bot A against bot B over a process pool with alternating colours.
+
+    Each game gets the seed seed + game, so any single game can be replayed, as long as neither bot keeps state
+    from one game to the next: each worker builds a spec's player once and reuses it, so a retained tree
+    (reuse, ponder), a transposition table or a rollout cache (table, cache_mb) carries over from the games that
+    worker played before. Nor do bots on a time budget (ms) or tree_workers bots replay exactly, since the
+    iterations that fit in a budget and the order the pool finishes rollouts in vary from run to run; workers
+    bots do, their searches being seeded from the game's seed. Results are appended to the JSONL file out as
+    they arrive.
+
+    Args:
+        bot_a:      Spec of bot A, see p2_bots.make_player().
+        bot_b:      Spec of bot B.
+        games:      Maximum number of games.
+        workers:    Number of worker processes, defaulting to the number of CPUs.
+        out:        Path of a JSONL file results are appended to, or None.
+        seed:       Base seed for the games.
+        sprt:       (elo0, elo1, alpha, beta) to stop early once an SPRT decides, or None to play every game.
+        on_result:  Called with each game's result dict and the running summary.
+        profile_out: Path of a .json or .csv file for the per-move records of profiled bots, or None.
+
+    Returns:        The summary dict from summarize(), plus 'llr' and 'decision' when sprt is given, and
+                    'profile_a'/'profile_b' from profiling.summarize() for profiled bots.
+
+    """
+    wins = draws = losses = 0
+    decision = None
+    llr = 0.
+    log_file = open(out, 'a') if out else None
+    records = {'a': [], 'b': []}
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(play_game, game, bot_a, bot_b, seed + game) for game in range(games)]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                if result['score'] == 1:
+                    wins += 1
+                elif result['score'] == 0:
+                    losses += 1
+                else:
+                    draws += 1
+
+                for side in records:
+                    for record in result.get('profile_' + side, ()):
+                        record.update(bot=side, game=result['game'])
+                        records[side].append(record)
+
+                if log_file:
+                    log_file.write(json.dumps(result) + '\n')
+                    log_file.flush()
+
+                summary = summarize(wins, draws, losses)
+                if sprt is not None:
+                    elo0, elo1, alpha, beta = sprt
+                    llr = sprt_llr(wins, draws, losses, elo0, elo1)
+                    decision = sprt_decision(llr, alpha, beta)
+                if on_result:
+                    on_result(result, summary)
+                if decision:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+            if log_file:
+                log_file.close()
+
+    summary = summarize(wins, draws, losses)
+    if sprt is not None:
+        summary['llr'] = llr
+        summary['decision'] = decision
+    for side in records:
+        if records[side]:
+            summary['profile_' + side] = profiling.summarize(records[side])
+    if profile_out and (records['a'] or records['b']):
+        write = profiling.write_csv if profile_out.endswith('.csv') else profiling.write_json
+        write(records['a'] + records['b'], profile_out)
+    return summary
@@ -0,0 +1,117 @@
+import csv
+import json
+
+import p2_t3
+
+phases = ('select', 'expand', 'rollout', 'backprop')
+
+# Columns of a per-move record, in export order.
+fields = ('move', 'player', 'iterations', 'seconds') + tuple(phase + '_seconds' for phase in phases) + (
+    'max_depth', 'tree_size', 'rollouts', 'rollout_moves', 'rollout_length', 'next_state_calls', 'apply_calls')
+
+
+class CountingBoard(p2_t3.Board):
+    """ A Board counting its next_state and apply calls, handed to the search while it is profiled. """
+
+    def __init__(self):
+        self.next_state_calls = 0
+        self.apply_calls = 0
+
+    def next_state(self, state, action):
+        self.next_state_calls += 1
+        return p2_t3.Board.next_state(self, state, action)
+
+    def apply(self, buffer, action):
+        self.apply_calls += 1
+        p2_t3.apply_move(buffer, action)
+
+
+def count_nodes(root):
+    """ Returns the number of distinct nodes reachable from root. """
+    seen = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if id(node) not in seen:
+            seen.add(id(node))
+            stack.extend(node.child_nodes.values())
+    return len(seen)
+
+
+class SearchProfile:
+    def __init__(self):
+        """ Per-move timings and counters of an MCTS object's searches, filled in while mcts_engine.MCTS.profile
+        is set. Each search appends one dict with the keys in fields to records.
+        """
+        self.board = CountingBoard()
+        self.records = []
+
+    def start(self, state):
+        """ Begins the record of a search from state. Returns it so the search can fill in the counters. """
+        record = dict((field, 0) for field in fields)
+        record['move'] = sum(bin(state[i]).count('1') for i in range(18))    # Pieces already played.
+        record['player'] = state[-1]
+        self.board.next_state_calls = 0
+        self.board.apply_calls = 0
+        self.records.append(record)
+        return record
+
+    def finish(self, record, root, iterations, seconds):
+        record['iterations'] = iterations
+        record['seconds'] = seconds
+        record['tree_size'] = count_nodes(root)
+        record['next_state_calls'] = self.board.next_state_calls
+        record['apply_calls'] = self.board.apply_calls
+        if record['rollouts']:
+            record['rollout_length'] = record['rollout_moves'] / record['rollouts']
+
+    def drain(self):
+        """ Returns the records so far and starts a fresh list. """
+        records, self.records = self.records, []
+        return records
+
+    def summary(self):
+        return summarize(self.records)
+
+    def to_json(self, path):
+        write_json(self.records, path)
+
+    def to_csv(self, path):
+        write_csv(self.records, path)
+
+
+def summarize(records):
+    """ Aggregates per-move records: totals of the counters, the share of time in each phase and per-move means.
+
+    Returns:    A dict, empty if there are no records.
+
+    """
+    if not records:
+        return {}
+    summary = {'moves': len(records)}
+    for field in fields[2:]:
+        summary[field] = sum(record[field] for record in records)
+    summary['max_depth'] = max(record['max_depth'] for record in records)
+    summary['tree_size'] = max(record['tree_size'] for record in records)
+    summary['rollout_length'] = summary['rollout_moves'] / summary['rollouts'] if summary['rollouts'] else 0.
+
+    phase_seconds = sum(summary[phase + '_seconds'] for phase in phases)
+    for phase in phases:
+        summary[phase + '_share'] = summary[phase + '_seconds'] / phase_seconds if phase_seconds else 0.
+    summary['iterations_per_second'] = summary['iterations'] / summary['seconds'] if summary['seconds'] else 0.
+    summary['iterations_per_move'] = summary['iterations'] / len(records)
+    return summary
+
+
+def write_json(records, path):
+    with open(path, 'w') as out:
+        json.dump(records, out, indent=1)
+
+
+def write_csv(records, path):
+    """ Writes records one per row. Columns beyond fields, such as a 'bot' label, come last. """
+    extra = sorted(set(key for record in records for key in record) - set(fields))
+    with open(path, 'w', newline='') as out:
+        writer = csv.DictWriter(out, fieldnames=list(fields) + extra)
+        writer.writeheader()
+        writer.writerows(records)
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+# Rough cost of one entry: the int key, the [games, score] list with its floats and the OrderedDict slot.
+entry_bytes = 256
+
+
+class RolloutCache:
+    def __init__(self, max_entries=None, max_bytes=64 << 20):
+        """ A bounded store of rollout results per position, kept across searches and games.
+
+        Entries are keyed by the state's Zobrist hash and hold the number of playouts from it and player 1's
+        total win_values over them, so they serve either side. When full, the least recently used entry is
+        evicted.
+
+        Args:
+            max_entries:    The most positions kept; if None it is derived from max_bytes.
+            max_bytes:      Approximate memory cap, at entry_bytes per position.
+
+        """
+        self.max_entries = max_entries if max_entries is not None else max(1, max_bytes // entry_bytes)
+        self.entries = OrderedDict()
+
+        self.hits = 0           # Lookups that found enough playouts to reuse.
+        self.misses = 0         # Lookups that had to play out the position.
+        self.evictions = 0      # Entries dropped to stay within max_entries.
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key, min_games=1):
+        """ Returns (games, player 1 score) for key if it has at least min_games playouts, else None. """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < min_games:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0], entry[1]
+
+    def record(self, key, p1_score, games=1):
+        """ Adds games playouts worth p1_score to player 1 to the entry for key. """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = [games, p1_score]
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            entry[0] += games
+            entry[1] += p1_score
+            self.entries.move_to_end(key)
+
+    def stats(self):
+        """ Returns the counters, the hit rate and the approximate size as a dict. """
+        lookups = self.hits + self.misses
+        return {
+            'cache_entries': len(self.entries),
+            'cache_bytes': len(self.entries) * entry_bytes,
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'cache_evictions': self.evictions,
+            'cache_hit_rate': self.hits / lookups if lookups else 0.,
+        }
@@ -0,0 +1,250 @@
+import argparse
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+import p2_t3
+import mcts_engine
+from p2_bots import parse_spec
+
+# File layout: a header, then fixed-width records appended game by game. The record count follows from the file
+# size, so appending never rewrites anything and a reader maps the records as one NumPy array.
+header = struct.Struct('<8sII')         # magic, version, record size
+magic = b'UTTTGAME'
+version = 1
+
+# One record per move. Actions are numbered 9 * (3 * R + C) + 3 * r + c, sub-board by sub-board.
+record_dtype = np.dtype([
+    ('boards', '<u2', 20),      # state[0:20]: the 18 sub-board masks, then both macro-board masks.
+    ('constraint', 'i1'),       # 3 * R + C of the sub-board the player must play in, -1 if free.
+    ('player', 'u1'),           # The player to move, 1 or 2.
+    ('ply', 'u1'),              # Moves played before this one.
+    ('move', 'u1'),             # The action played.
+    ('visits', '<u2', 81),      # Root visits per action, scaled down in proportion if the largest passes 65535.
+    ('root_visits', '<u4'),     # Total visits of the search's root.
+    ('result', 'i1'),           # points_values of player 1 at the end of the game: 1, 0 or -1.
+    ('seed', '<u4'),            # The game's seed, which replays it.
+])
+
+board = p2_t3.Board()
+engines = {}    # spec -> MCTS object, built once per worker process.
+
+
+def action_index(action):
+    R, C, r, c = action
+    return 9 * (3 * R + C) + 3 * r + c
+
+
+def index_action(index):
+    outer, inner = divmod(int(index), 9)
+    return outer // 3, outer % 3, inner // 3, inner % 3
+
+
+def record_state(row):
+    """ Rebuilds the state tuple of a record, e.g. to search or evaluate it again. """
+    boards = tuple(int(mask) for mask in row['boards'])
+    constraint = int(row['constraint'])
+    if constraint < 0:
+        return boards + (None, None, int(row['player']))
+    return boards + (constraint // 3, constraint % 3, int(row['player']))
+
+
+def get_engine(spec):
+    """ Returns this process's search for an 'mcts:...' spec, building it on first use. """
+    if spec not in engines:
+        name, options = parse_spec(spec)
+        if name != 'mcts':
+            raise ValueError("self-play needs an mcts spec, not %r" % spec)
+        try:
+            engines[spec] = mcts_engine.build(**options)
+        except TypeError as error:
+            raise ValueError("bad options for %s: %s" % (name, error))
+    return engines[spec]
+
+
+def play_game(spec, seed, sample_plies=8):
+    """ Plays one self-play game in a worker process.
+
+    Args:
+        spec:           The bot playing both sides, an mcts spec as for p2_bots.make_player().
+        seed:           Seed of the game's random number generator.
+        sample_plies:   The first moves are drawn in proportion to root visits instead of taken as the search's
+                        choice, so games from different seeds spread over more openings.
+
+    Returns:        The game's records, an array of record_dtype.
+
+    """
+    random.seed(seed)
+    engine = get_engine(spec)
+    state = board.starting_state()
+    records = np.zeros(81, record_dtype)
+    ply = 0
+    while not board.is_ended(state):
+        root, _ = engine.search(board, state)
+        row = records[ply]
+        row['boards'] = state[:20]
+        row['constraint'] = -1 if state[20] is None else 3 * state[20] + state[21]
+        row['player'] = state[-1]
+        row['ply'] = ply
+        row['root_visits'] = root.visits
+
+        actions = list(root.child_nodes)
+        visits = [root.child_nodes[action].visits for action in actions]
+        scale = min(1., 65535. / max(visits))
+        for action, count in zip(actions, visits):
+            row['visits'][action_index(action)] = int(count * scale)
+
+        if ply < sample_plies:
+            action = random.choices(actions, visits)[0]
+        else:
+            action = engine.best_action(root, board, state, state[-1])
+        row['move'] = action_index(action)
+        if engine.pool is not None:
+            engine.pool.release(root)
+        state = board.next_state(state, action)
+        ply += 1
+
+    records = records[:ply]
+    records['result'] = board.points_values(state)[1]
+    records['seed'] = seed
+    return records
+
+
+class RecordWriter:
+    def __init__(self, path, chunk_records=4096):
+        """ Appends records to a game file, writing them out in chunks.
+
+        A new file gets a header; an existing one must have a matching header, and a partly written record at its
+        end, left by a writer that was killed, is cut off so new records stay aligned.
+
+        Args:
+            path:           The file to append to.
+            chunk_records:  Records buffered before a write.
+
+        """
+        self.path = path
+        self.chunk_records = chunk_records
+        self.buffer = []
+        self.buffered = 0
+        self.written = 0
+
+        self.file = open(path, 'ab')
+        size = self.file.tell()
+        if size == 0:
+            self.file.write(header.pack(magic, version, record_dtype.itemsize))
+        else:
+            check_header(path)
+            whole = header.size + (size - header.size) // record_dtype.itemsize * record_dtype.itemsize
+            if whole != size:
+                self.file.truncate(whole)
+
+    def write(self, records):
+        self.buffer.append(records)
+        self.buffered += len(records)
+        if self.buffered >= self.chunk_records:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(np.concatenate(self.buffer).tobytes())
+            self.written += self.buffered
+            self.buffer = []
+            self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def check_header(path):
+    with open(path, 'rb') as game_file:
+        data = game_file.read(header.size)
+    if len(data) < header.size:
+        raise ValueError("%s is too short for a game file" % path)
+    file_magic, file_version, size = header.unpack(data)
+    if file_magic != magic or file_version != version or size != record_dtype.itemsize:
+        raise ValueError("%s is not a version %d game file" % (path, version))
+
+
+def read_records(path):
+    """ Maps a game file read-only. Nothing is copied: the fields of the returned array, such as
+    records['visits'], are views of the mapped file, and only the pages touched are read.
+
+    Returns:    An array of record_dtype with every whole record in the file.
+
+    """
+    check_header(path)
+    count = (os.path.getsize(path) - header.size) // record_dtype.itemsize
+    if count == 0:
+        return np.zeros(0, record_dtype)
+    return np.memmap(path, record_dtype, 'r', header.size, (count,))
+
+
+def generate(path, spec, games, workers=None, seed=0, sample_plies=8, chunk_records=4096, progress=None):
+    """ Plays self-play games over a process pool and appends their records to path as they finish.
+
+    Only a few games per worker are in flight at once, so memory stays flat however many games are asked for.
+
+    Args:
+        path:           Game file to append to.
+        spec:           The bot playing both sides, an mcts spec such as 'mcts:rollout=heuristic,ms=100'.
+        games:          Number of games.
+        workers:        Number of worker processes, defaulting to the number of CPUs.
+        seed:           Game i is played with seed + i.
+        sample_plies:   See play_game().
+        chunk_records:  Records buffered before a write.
+        progress:       Called with (games done, records written so far) after each game.
+
+    Returns:        The number of records written.
+
+    """
+    get_engine(spec)    # Raise ValueError for a bad spec before starting the pool.
+    workers = workers or os.cpu_count() or 1
+    with RecordWriter(path, chunk_records) as writer, ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        submitted = done = 0
+        while submitted < games or pending:
+            while submitted < games and len(pending) < 2 * workers:
+                pending.add(pool.submit(play_game, spec, seed + submitted, sample_plies))
+                submitted += 1
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                writer.write(future.result())
+                done += 1
+                if progress:
+                    progress(done, writer.written + writer.buffered)
+        writer.flush()
+        return writer.written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Append self-play games to a binary game file.")
+    parser.add_argument('out', help="game file to append to")
+    parser.add_argument('--bot', default='mcts:rollout=heuristic,ms=100', help="mcts spec playing both sides")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--seed', type=int, default=0, help="base seed, game i uses seed + i")
+    parser.add_argument('--sample-plies', type=int, default=8, help="opening moves drawn in proportion to visits")
+    args = parser.parse_args()
+
+    def report(done, records):
+        if done % 10 == 0 or done == args.games:
+            print("%d/%d games, %d records" % (done, args.games, records))
+
+    try:
+        written = generate(args.out, args.bot, args.games, args.workers, args.seed, args.sample_plies,
+                           progress=report)
+    except ValueError as error:
+        print(error)
+        exit(1)
+    print("Appended %d records to %s" % (written, args.out))
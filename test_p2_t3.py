@@ -0,0 +1,89 @@
+import random
+
+import p2_t3
+import mcts_engine
+from endgame import EndgameSolver, remaining_moves
+
+board = p2_t3.Board()
+state0 = board.starting_state()
+
+
+def test_incremental_zobrist_matches_scratch():
+    rng = random.Random(0)
+    for _ in range(200):
+        state = board.hashed(state0)
+        while not board.is_ended(state):
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+            assert type(state) is p2_t3.HashedState
+            assert state.zobrist == p2_t3.zobrist_hash(state)
+
+
+def test_selection_keeps_the_hash():
+    random.seed(0)
+    engine = mcts_engine.build(select='ucb1_tuned', nodes=500, cache_mb=1)
+    root, _ = engine.search(board, state0)
+    for selector in (mcts_engine.UCT(), mcts_engine.UCB1Tuned(), mcts_engine.RAVE()):
+        leaf, state = selector.select(root, board, board.hashed(state0), 1)
+        assert leaf is not root
+        assert state.zobrist == p2_t3.zobrist_hash(state)
+
+
+def test_do_and_undo_match_next_state():
+    rng = random.Random(0)
+    for _ in range(200):
+        position = board.mutable(state0)
+        states = [state0]
+        while not board.is_ended(states[-1]):
+            action = rng.choice(board.legal_actions(states[-1]))
+            states.append(board.next_state(states[-1], action))
+            position.do(action)
+            assert position.freeze() == states[-1]
+        while position.history:
+            position.undo()
+            states.pop()
+            assert position.freeze() == states[-1]
+        assert position.freeze() == state0
+
+
+def late_positions(count, moves_left, seed):
+    """ Returns count unfinished positions of random games with at most moves_left cells left to play. """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = state0
+        while not board.is_ended(state) and remaining_moves(state) > moves_left:
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+        if not board.is_ended(state):
+            positions.append(state)
+    return positions
+
+
+def minimax(state):
+    """ The value of state for the player to move, +1, 0 or -1, by plain minimax. """
+    values = board.win_values(state)
+    if values is not None:
+        return 2 * values[state[-1]] - 1
+    return max(-minimax(board.next_state(state, action)) for action in board.legal_actions(state))
+
+
+def test_endgame_solver_matches_minimax():
+    solver = EndgameSolver(9)
+    for state in late_positions(40, 9, seed=0):
+        assert solver.solve(board, state) == minimax(state)
+
+
+def test_proven_root_has_the_exact_value_and_plays_it():
+    solver = EndgameSolver(99)
+    proven = 0
+    for index, state in enumerate(late_positions(20, 14, seed=1)):
+        random.seed(index)
+        engine = mcts_engine.build(solve=8, nodes=20000)
+        root, _ = engine.search(board, state)
+        if root.proven is None:
+            continue
+        proven += 1
+        value = solver.solve(board, state)
+        assert root.proven == (value + 1) / 2.
+        action = engine.best_action(root, board, state, state[-1])
+        assert -solver.solve(board, board.next_state(state, action)) == value
+    assert proven >= 10
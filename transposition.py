@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+
+class TranspositionTable:
+    def __init__(self, max_entries=100000):
+        """ A bounded map from game states to tree nodes, so positions reached by different move orders share one
+        node and its statistics. When full, the least recently used entry is evicted.
+
+        Args:
+            max_entries:    The most states kept at once.
+
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+        self.hits = 0           # Lookups that found a node.
+        self.misses = 0         # Lookups that found nothing.
+        self.evictions = 0      # Entries dropped to stay within max_entries.
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """ Returns the node stored for key, or None, and counts the lookup as a hit or a miss. """
+        node = self.entries.get(key)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return node
+
+    def put(self, key, node):
+        """ Stores node under key, evicting the least recently used entry if the table is full. """
+        self.entries[key] = node
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def stats(self):
+        """ Returns the counters and the hit rate as a dict. """
+        return {
+            'table_entries': len(self.entries),
+            'table_hits': self.hits,
+            'table_misses': self.misses,
+            'table_evictions': self.evictions,
+            'table_hit_rate': self.hit_rate(),
+        }